@@ -9,7 +9,7 @@ from livekit import agents, rtc
 from livekit.agents import Agent, AgentSession
 from livekit.plugins import google, simli
 from livekit.plugins.google.beta import realtime
-from mcp_client import MCPServerSse
+from mcp_client import MCPServerSse, MCPServerStreamableHttp
 from mcp_client.agent_tools import MCPToolsIntegration
 from PIL import Image
 from datetime import datetime, timezone
@@ -219,8 +219,10 @@ async def entrypoint(ctx: agents.JobContext):
             name="Scheme Saarthi MCP Server"
         )
         
-        # RAG MCP Server (government scheme knowledge base)
-        rag_server = MCPServerSse(
+        # RAG MCP Server (government scheme knowledge base); a URL ending in /mcp
+        # targets its multi-worker streamable HTTP mode
+        rag_server_cls = MCPServerStreamableHttp if rag_server_url.rstrip("/").endswith("/mcp") else MCPServerSse
+        rag_server = rag_server_cls(
             params={"url": rag_server_url},
             cache_tools_list=True,
             name="Scheme Saarthi RAG Server"
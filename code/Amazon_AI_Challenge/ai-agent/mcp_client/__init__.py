@@ -1 +1 @@
-from .server import MCPServer, MCPServerSse, MCPServerStdio, MCPServerSseParams, MCPServerStdioParams
+from .server import MCPServer, MCPServerSse, MCPServerStreamableHttp, MCPServerStdio, MCPServerSseParams, MCPServerStdioParams
@@ -8,6 +8,7 @@ from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStre
 import mcp.types
 from mcp.types import CallToolResult, JSONRPCMessage, Tool as MCPTool
 from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
 from mcp.client.session import ClientSession
 
 # Base class for MCP servers
@@ -83,7 +84,8 @@ class _MCPServerWithClientSession(MCPServer):
         """Connect to the server."""
         try:
             transport = await self.exit_stack.enter_async_context(self.create_streams())
-            read, write = transport
+            # Streamable HTTP also yields a session-id getter
+            read, write = transport[0], transport[1]
             session = await self.exit_stack.enter_async_context(ClientSession(read, write))
             await session.initialize()
             self.session = session
@@ -185,6 +187,20 @@ class MCPServerSse(_MCPServerWithClientSession):
         return self._name
 
 
+# Streamable HTTP server implementation
+class MCPServerStreamableHttp(MCPServerSse):
+    """MCP server implementation that uses the streamable HTTP transport (e.g. multi-worker RAG server on /mcp)."""
+
+    def create_streams(self):
+        """Create the streams for the server."""
+        return streamablehttp_client(
+            url=self.params["url"],
+            headers=self.params.get("headers"),
+            timeout=self.params.get("timeout", 5),
+            sse_read_timeout=self.params.get("sse_read_timeout", 60 * 5),
+        )
+
+
 # Stdio server implementation
 class MCPServerStdio(MCPServer):
     """An example (minimal) Stdio server implementation."""
@@ -0,0 +1,97 @@
+"""
+Approximate nearest neighbour index for the numpy vector store
+
+IVF-flat: rows are clustered with spherical k-means and each query only
+scores the rows of its ``nprobe`` closest clusters. Vectors are not copied;
+the index stores row numbers into the store's (possibly memory-mapped)
+embedding matrix, so the only extra memory is one int64 per row.
+"""
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows per block when assigning vectors to centroids
+_ASSIGN_BLOCK_ROWS = 16384
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assign = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], _ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assign[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def _spherical_kmeans(sample: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = sample[rng.choice(sample.shape[0], k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums
+        # Re-seed empty clusters from random sample rows
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            centroids[empty] = sample[rng.choice(sample.shape[0], empty.size, replace=False)]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids /= norms
+    return centroids
+
+
+class IVFFlatIndex:
+    """Inverted-file index over unit-length vectors (cosine similarity)."""
+
+    def __init__(self, n_lists: int, iterations: int = 10, sample_per_list: int = 64, seed: int = 0):
+        self.n_lists = n_lists
+        self.iterations = iterations
+        self.sample_per_list = sample_per_list
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        # Rows grouped by list: rows of list i are _rows[_offsets[i]:_offsets[i+1]]
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        self._assign = np.zeros(0, dtype=np.int64)
+        # Number of leading store rows covered by the index
+        self.size = 0
+        self.trained_rows = 0
+
+    def train(self, vectors: np.ndarray):
+        """Fit centroids on a sample of ``vectors`` and index all of them."""
+        rng = np.random.default_rng(self.seed)
+        n = vectors.shape[0]
+        self.n_lists = max(1, min(self.n_lists, n))
+        sample_size = min(n, self.n_lists * self.sample_per_list)
+        sample_idx = np.sort(rng.choice(n, sample_size, replace=False))
+        sample = np.asarray(vectors[sample_idx], dtype=np.float32)
+        self.centroids = _spherical_kmeans(sample, self.n_lists, self.iterations, rng)
+        self._assign = np.zeros(0, dtype=np.int64)
+        self.size = 0
+        self.add(vectors)
+        self.trained_rows = n
+
+    def add(self, vectors: np.ndarray):
+        """Index rows ``size..size+len(vectors)`` of the store."""
+        if vectors.shape[0] == 0:
+            return
+        assign = _nearest_centroid(vectors, self.centroids)
+        self._assign = np.concatenate([self._assign, assign])
+        self.size += vectors.shape[0]
+        self._rows = np.argsort(self._assign, kind="stable")
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(self._assign, minlength=self.n_lists))))
+
+    def probe(self, qvec: np.ndarray, nprobe: int) -> np.ndarray:
+        """Candidate rows from the ``nprobe`` lists closest to ``qvec``."""
+        nprobe = min(max(1, nprobe), self.n_lists)
+        closeness = self.centroids @ qvec
+        if nprobe < self.n_lists:
+            lists = np.argpartition(-closeness, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.n_lists)
+        return np.concatenate([self._rows[self._offsets[i]:self._offsets[i + 1]] for i in lists])
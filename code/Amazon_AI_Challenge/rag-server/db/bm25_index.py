@@ -0,0 +1,114 @@
+"""
+BM25 lexical index over the vector store's chunk texts
+
+Scheme ids ("PM-KISAN", "PMAY-G"), helpline numbers and error codes need
+exact token matches that embeddings only approximate. Tokens keep their
+inner hyphens/dots/slashes, so "pm-kisan" is one term, and each part is
+indexed as well so "PM Kisan" still matches. Each term's postings (row
+numbers and term frequencies) are appended as NumPy chunks per added batch
+and concatenated on first use, so a query only touches the postings of its
+own terms.
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_TERM_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms of ``text``; compound terms are followed by their parts."""
+    terms = []
+    for term in _TERM_RE.findall(text.lower()):
+        terms.append(term)
+        if not term.isalnum():
+            terms.extend(_SPLIT_RE.split(term))
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over rows ``0..size`` of the store, appended in order."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = 0
+        self._total_len = 0
+        # Over-allocated token counts per row; rows 0..size are valid
+        self._doc_len = np.zeros(256, dtype=np.float32)
+        # term -> [(rows, term frequencies), ...], one chunk per add()
+        self._chunks: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, texts: List[str]):
+        """Index ``texts`` as rows ``size..size+len(texts)``."""
+        start = self.size
+        lengths = np.empty(len(texts), dtype=np.float32)
+        batch: Dict[str, Tuple[List[int], List[int]]] = {}
+        for offset, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[offset] = sum(counts.values())
+            for term, tf in counts.items():
+                rows, tfs = batch.setdefault(term, ([], []))
+                rows.append(start + offset)
+                tfs.append(tf)
+        with self._lock:
+            for term, (rows, tfs) in batch.items():
+                self._chunks.setdefault(term, []).append(
+                    (np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float32))
+                )
+                self._arrays.pop(term, None)
+            need = start + len(texts)
+            if self._doc_len.shape[0] < need:
+                grown = np.zeros(max(need, 2 * self._doc_len.shape[0]), dtype=np.float32)
+                grown[:start] = self._doc_len[:start]
+                self._doc_len = grown
+            self._doc_len[start:need] = lengths
+            self._total_len += int(lengths.sum())
+            self.size = need
+
+    def _postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # Caller holds self._lock
+        cached = self._arrays.get(term)
+        if cached is None:
+            chunks = self._chunks.get(term)
+            if not chunks:
+                return None
+            if len(chunks) == 1:
+                cached = chunks[0]
+            else:
+                cached = (np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks]))
+                self._chunks[term] = [cached]
+            self._arrays[term] = cached
+        return cached
+
+    def scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ``(rows, scores)`` for every row containing at least one query term,
+        rows ascending. Cost is proportional to the terms' posting lengths.
+        """
+        all_rows, all_weights = [], []
+        with self._lock:
+            n = self.size
+            avg_len = (self._total_len / n if n else 0.0) or 1.0
+            for term, qtf in Counter(tokenize(query)).items():
+                postings = self._postings(term)
+                if postings is None:
+                    continue
+                rows, tfs = postings
+                idf = math.log(1.0 + (n - rows.size + 0.5) / (rows.size + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[rows] / avg_len)
+                all_rows.append(rows)
+                all_weights.append(qtf * idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not all_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if len(all_rows) == 1:
+            return all_rows[0], all_weights[0]
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        return rows, np.bincount(inverse, np.concatenate(all_weights)).astype(np.float32)
@@ -1,16 +1,56 @@
 import os
 import json
+import bisect
+import itertools
+import logging
+import threading
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from dotenv import load_dotenv
+from db import segment_store
+from db.ann_index import IVFFlatIndex
+from db.quantization import Int8Quantizer
+from db.embedders import GoogleBatchEmbedder, HashingVectorizer, StubEmbedContent
+from db.embed_cache import EmbeddingCache
+from db.sparse_matrix import CSRMatrix
+from db.bm25_index import BM25Index
+from db.scheme_index import SchemeLookupIndex
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 STORE_DIR = Path(__file__).parent.parent / ".vectorstore"
 STORE_DIR.mkdir(exist_ok=True)
+# Legacy compressed format, migrated to segment files on first connect()
 STORE_FILE = STORE_DIR / "store.npz"
 META_FILE = STORE_DIR / "meta.json"
+# On-disk vector precision; float16 halves file size and page-cache footprint
+STORE_DTYPE = (os.getenv("RAG_STORE_DTYPE", "float32") or "float32").lower()
+# Merge the tail segments once there are more than this many of them
+COMPACT_MAX_SEGMENTS = int(os.getenv("RAG_COMPACT_MAX_SEGMENTS", "16"))
+# Rewrite the store once this fraction of on-disk rows are deleted/replaced
+COMPACT_DEAD_RATIO = float(os.getenv("RAG_COMPACT_DEAD_RATIO", "0.25"))
+# Approximate search: "ivf" or "none". Below ANN_MIN_ROWS search is always exact.
+ANN_INDEX = (os.getenv("RAG_ANN_INDEX", "ivf") or "ivf").lower()
+ANN_MIN_ROWS = int(os.getenv("RAG_ANN_MIN_ROWS", "50000"))
+# Recall/latency knob: clusters scored per query (0 lists = 4*sqrt(rows))
+ANN_NPROBE = int(os.getenv("RAG_ANN_NPROBE", "8"))
+ANN_LISTS = int(os.getenv("RAG_ANN_LISTS", "0"))
+# "int8" keeps 1-byte codes in RAM for first-pass scoring and re-ranks a
+# shortlist of RERANK_FACTOR * k rows with the exact (memory-mapped) vectors;
+# "sparse" stores CSR rows and scores only their non-zeros. "auto" picks
+# sparse for the local hashing backend and float32 otherwise.
+VECTOR_STORAGE = (os.getenv("RAG_VECTOR_STORAGE", "auto") or "auto").lower()
+RERANK_FACTOR = int(os.getenv("RAG_RERANK_FACTOR", "8"))
+# Hybrid search: each ranker contributes its best HYBRID_CANDIDATES * k rows,
+# fused by reciprocal rank with constant HYBRID_RRF_K
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "4"))
+HYBRID_RRF_K = int(os.getenv("RAG_HYBRID_RRF_K", "60"))
+_HYBRID_MIN_CANDIDATES = 20
+_RERANK_MIN = 64
+_QUANT_SAMPLE_ROWS = 100000
 
 # Get embedding model name and ensure it has the models/ prefix for Google
 RAW_MODEL_NAME = os.getenv("RAG_EMBEDDING_MODEL", "text-embedding-004")
@@ -21,143 +61,965 @@ else:
 
 EMBED_BACKEND = (os.getenv("RAG_EMBED_BACKEND", "local") or "local").lower()
 API_KEY = os.getenv("GOOGLE_API_KEY")
+# Recorded in the manifest so vectors from different models are never mixed
+# Local backend: stable feature hashing, optionally with word/char n-grams
+HASH_DIM = int(os.getenv("RAG_HASH_DIM", "1024"))
+HASH_WORD_NGRAMS = int(os.getenv("RAG_HASH_WORD_NGRAMS", "1"))
+HASH_CHAR_NGRAMS = int(os.getenv("RAG_HASH_CHAR_NGRAMS", "0"))
+_HASHER = HashingVectorizer(HASH_DIM, word_ngrams=HASH_WORD_NGRAMS, char_ngrams=HASH_CHAR_NGRAMS)
+EMBED_MODEL_ID = {"google": DEFAULT_EMBED_MODEL, "stub": "stub-768"}.get(EMBED_BACKEND, _HASHER.model_id)
+if VECTOR_STORAGE == "auto":
+    VECTOR_STORAGE = "float32" if EMBED_BACKEND in ("google", "stub") else "sparse"
+# Google batch embedding: texts per request (API max 100), parallel requests, retries
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "100"))
+EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("RAG_EMBED_MAX_RETRIES", "6"))
+# Embedding cache: "auto" (disk tier for remote backends, memory-only for
+# local hashing), "disk", "memory" or "off"
+EMBED_CACHE = (os.getenv("RAG_EMBED_CACHE", "auto") or "auto").lower()
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("RAG_EMBED_CACHE_MEMORY_ITEMS", "4096"))
+EMBED_CACHE_MAX_MB = int(os.getenv("RAG_EMBED_CACHE_MAX_MB", "512"))
+EMBED_CACHE_FILE = STORE_DIR / "embed_cache.sqlite"
+
+_RANGE_OPS = ("$gt", "$gte", "$lt", "$lte")
+# Process-wide, so a reloaded client never reuses an older client's versions
+_content_versions = itertools.count(1)
+# Rows upcast per block when scoring a float16 matrix
+_SCORE_BLOCK_ROWS = 65536
+
+
+def _normalize_rows(vecs: np.ndarray) -> np.ndarray:
+    """Return a contiguous float32 copy of ``vecs`` with unit-length rows."""
+    vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+    if vecs.size == 0:
+        return vecs
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vecs / norms, dtype=np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the ``k`` highest scores along the last axis, best first.
+    Uses partial selection so only the k winners are ever sorted.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def _score(qvecs: np.ndarray, matrix: Union[np.ndarray, CSRMatrix]) -> np.ndarray:
+    """Cosine scores of unit-length ``qvecs`` against unit-length ``matrix`` rows."""
+    if isinstance(matrix, CSRMatrix):
+        return matrix.dot(qvecs)
+    if matrix.dtype == np.float32:
+        return qvecs @ matrix.T
+    # Upcast reduced-precision rows block by block instead of copying the corpus
+    out = np.empty((qvecs.shape[0], matrix.shape[0]), dtype=np.float32)
+    for start in range(0, matrix.shape[0], _SCORE_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+        out[:, start:start + block.shape[0]] = qvecs @ block.T
+    return out
 
 
 class _VectorStoreClient:
     def __init__(self):
-        self.embeddings: Optional[np.ndarray] = None
+        self.embeddings: Optional[Union[np.ndarray, CSRMatrix]] = None
         self.texts: List[str] = []
         self.metadatas: List[Dict[str, Any]] = []
         self.ids: List[str] = []
         self.dim: Optional[int] = None
+        # Embedding model the stored vectors came from (None if unknown/empty)
+        self.embed_model: Optional[str] = None
+        # CSR rows instead of a dense matrix (fixed per store, see VECTOR_STORAGE)
+        self._sparse = VECTOR_STORAGE == "sparse"
         self._connected = False
+        self._generation = 0
+        # Changes whenever the set of live chunks may have changed (never
+        # repeats within a process), so callers can key cached answers on it
+        self.version = 0
+        # Append-only segment log (see db/segment_store.py)
+        self._segments: List[Dict[str, Any]] = []
+        self._next_segment = 1
+        # Over-allocated row buffer backing self.embeddings once rows are appended
+        self._buffer: Optional[np.ndarray] = None
+        # Tombstones: replaced/deleted rows stay in place until compaction
+        self._alive: np.ndarray = np.zeros(0, dtype=bool)
+        self._alive_buf: Optional[np.ndarray] = None
+        self._dead = 0
+        self._id_to_row: Dict[str, int] = {}
+        self._write_lock = threading.RLock()
+        self._compactor: Optional[threading.Thread] = None
+        self._compact_lock = threading.Lock()
+        # IVF index, trained in the background once the corpus is large
+        self._ann: Optional[IVFFlatIndex] = None
+        self._ann_builder: Optional[threading.Thread] = None
+        self._ann_lock = threading.Lock()
+        self._ann_epoch = 0
+        # Int8 codes for RAG_VECTOR_STORAGE=int8, encoded lazily on search
+        self._quantizer: Optional[Int8Quantizer] = None
+        self._codes_buf: Optional[np.ndarray] = None
+        self._codes_n = 0
+        self._quant_fit_rows = 0
+        self._codes_lock = threading.Lock()
+        self._google_embedder: Optional[GoogleBatchEmbedder] = None
+        self._embed_cache: Optional[EmbeddingCache] = None
+        # Inverted metadata index: (field, value) -> row positions
+        self._meta_postings: Dict[Tuple[str, Any], List[int]] = {}
+        self._meta_arrays: Dict[Tuple[str, Any], np.ndarray] = {}
+        # Sorted distinct values per field, used by range filters
+        self._field_values: Dict[str, Dict[str, List[Any]]] = {}
+        # BM25 over self.texts, built on the first hybrid search
+        self._bm25: Optional[BM25Index] = None
+        # Scheme id/name/alias -> scheme_id, built on the first lookup_scheme()
+        self._schemes: Optional[SchemeLookupIndex] = None
 
     def connect(self):
-        # No-op for local backend; Google config happens lazily when used
-        pass
-
-        if STORE_FILE.exists() and META_FILE.exists():
-            data = np.load(STORE_FILE)
-            self.embeddings = data["embeddings"]
-            with META_FILE.open("r", encoding="utf-8") as f:
-                meta = json.load(f)
-            self.texts = meta.get("texts", [])
-            self.metadatas = meta.get("metadatas", [])
-            self.ids = meta.get("ids", [])
-            self.dim = int(data["embeddings"].shape[1]) if self.embeddings.size else None
-        else:
-            self.embeddings = np.zeros((0, 0), dtype=np.float32)
-            self.texts = []
-            self.metadatas = []
-            self.ids = []
-            self.dim = None
+        # Load the segment log (or migrate a legacy single-file store); Google config stays lazy
+        self._clear_state()
+        manifest = segment_store.read_manifest(STORE_DIR)
+        if manifest is not None:
+            self._load_segments(manifest)
+        elif STORE_FILE.exists() and META_FILE.exists():
+            self._migrate_legacy_store()
+        self._index_metadata(0, self.metadatas)
         self._connected = True
 
-    def _persist(self):
-        if self.embeddings is None:
+    def model_mismatch(self) -> bool:
+        """
+        Whether the stored chunks were embedded by another (or an unknown)
+        model than EMBED_MODEL_ID, so queries would be scored against
+        incomparable vectors until the store is re-ingested.
+        """
+        if not self._connected:
+            self.connect()
+        return bool(self._id_to_row) and self.embed_model != EMBED_MODEL_ID
+
+    def _clear_state(self):
+        self.version = next(_content_versions)
+        self._sparse = VECTOR_STORAGE == "sparse"
+        self.embeddings = CSRMatrix.empty() if self._sparse else np.zeros((0, 0), dtype=np.float32)
+        self.texts = []
+        self.metadatas = []
+        self.ids = []
+        self.dim = None
+        self._generation = 0
+        self._segments = []
+        self._next_segment = 1
+        self._buffer = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._alive_buf = None
+        self._dead = 0
+        self._id_to_row = {}
+        self.embed_model = None
+        self._meta_postings = {}
+        self._meta_arrays = {}
+        self._field_values = {}
+        self._bm25 = None
+        self._schemes = None
+        self._ann = None
+        self._ann_epoch += 1
+        self._quantizer = None
+        self._codes_buf = None
+        self._codes_n = 0
+        self._quant_fit_rows = 0
+
+    def reloaded(self) -> "_VectorStoreClient":
+        """
+        A new, connected client if another process (e.g. an ingest run) has
+        published a newer generation, else ``self``. Callers swap the returned
+        object in with one assignment; searches already running finish on the
+        old client, whose mapped segment files stay valid until it is dropped.
+        """
+        manifest = segment_store.read_manifest(STORE_DIR)
+        if manifest is not None and int(manifest.get("generation", 0)) == self._generation:
+            return self
+        fresh = type(self)()
+        fresh.connect()
+        return fresh
+
+    def reset(self):
+        """Drop every chunk, e.g. before re-ingesting with another embedding model."""
+        if not self._connected:
+            self.connect()
+        with self._compact_lock, self._write_lock:
+            old_segments = self._segments
+            generation, next_segment = self._generation, self._next_segment
+            self._clear_state()
+            self._generation, self._next_segment = generation, next_segment
+            self._publish()
+        for seg in old_segments:
+            segment_store.remove_segment(STORE_DIR, seg["name"])
+
+    def _index_metadata(self, start: int, metadatas: List[Dict[str, Any]]):
+        """Add rows ``start..start+len(metadatas)`` to the metadata index."""
+        for offset, md in enumerate(metadatas):
+            for key, value in md.items():
+                try:
+                    pair = (key, value)
+                    posting = self._meta_postings.get(pair)
+                    if posting is None:
+                        posting = self._meta_postings[pair] = []
+                        self._field_values.pop(key, None)
+                    posting.append(start + offset)
+                except TypeError:
+                    # Unhashable values (lists, dicts) are matched by scanning
+                    continue
+                self._meta_arrays.pop(pair, None)
+
+    def _postings(self, key: str, value: Any) -> np.ndarray:
+        """Sorted row positions whose metadata has ``key == value``."""
+        try:
+            pair = (key, value)
+            cached = self._meta_arrays.get(pair)
+        except TypeError:
+            return np.array([i for i, md in enumerate(self.metadatas) if md.get(key) == value], dtype=np.int64)
+        if cached is None:
+            cached = np.array(self._meta_postings.get(pair, ()), dtype=np.int64)
+            self._meta_arrays[pair] = cached
+        return cached
+
+    def _union_postings(self, key: str, values: List[Any]) -> np.ndarray:
+        arrays = [self._postings(key, v) for v in values]
+        if not arrays:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(arrays))
+
+    def _range_postings(self, key: str, bounds: Dict[str, Any]) -> np.ndarray:
+        """Rows whose ``key`` value satisfies every ``$gt/$gte/$lt/$lte`` bound."""
+        kinds = {"str" if isinstance(b, str) else "num" for b in bounds.values()}
+        if len(kinds) != 1:
+            raise ValueError(f"Range bounds for '{key}' must all be numbers or all be strings")
+        kind = kinds.pop()
+
+        by_kind = self._field_values.get(key)
+        if by_kind is None:
+            by_kind = {"num": [], "str": []}
+            for field, value in self._meta_postings:
+                if field != key or isinstance(value, bool):
+                    continue
+                if isinstance(value, (int, float)):
+                    by_kind["num"].append(value)
+                elif isinstance(value, str):
+                    by_kind["str"].append(value)
+            by_kind["num"].sort()
+            by_kind["str"].sort()
+            self._field_values[key] = by_kind
+        values = by_kind[kind]
+
+        lo, hi = 0, len(values)
+        if "$gte" in bounds:
+            lo = max(lo, bisect.bisect_left(values, bounds["$gte"]))
+        if "$gt" in bounds:
+            lo = max(lo, bisect.bisect_right(values, bounds["$gt"]))
+        if "$lte" in bounds:
+            hi = min(hi, bisect.bisect_right(values, bounds["$lte"]))
+        if "$lt" in bounds:
+            hi = min(hi, bisect.bisect_left(values, bounds["$lt"]))
+        return self._union_postings(key, values[lo:hi])
+
+    def _match_rows(self, key: str, condition: Any) -> np.ndarray:
+        """
+        Rows matching one field condition. A plain value means equality;
+        a dict may combine $eq, $ne, $in, $nin, $gt, $gte, $lt and $lte.
+        $ne/$nin also match rows that do not have the field at all.
+        """
+        if not isinstance(condition, dict):
+            return self._postings(key, condition)
+        if not condition:
+            raise ValueError(f"Empty operator dict in metadata filter for '{key}'")
+
+        matches: List[np.ndarray] = []
+        bounds = {}
+        for op, operand in condition.items():
+            if op == "$eq":
+                matches.append(self._postings(key, operand))
+            elif op in ("$in", "$nin") and not isinstance(operand, (list, tuple)):
+                raise ValueError(f"Metadata filter operator {op} on '{key}' needs a list, got {type(operand).__name__}")
+            elif op == "$in":
+                matches.append(self._union_postings(key, operand))
+            elif op in ("$ne", "$nin"):
+                excluded = self._postings(key, operand) if op == "$ne" else self._union_postings(key, operand)
+                matches.append(np.setdiff1d(np.arange(len(self.metadatas)), excluded, assume_unique=True))
+            elif op in _RANGE_OPS:
+                bounds[op] = operand
+            else:
+                raise ValueError(f"Unsupported metadata filter operator: {op}")
+        if bounds:
+            matches.append(self._range_postings(key, bounds))
+
+        rows = matches[0]
+        for arr in matches[1:]:
+            rows = np.intersect1d(rows, arr, assume_unique=True)
+        return rows
+
+    def _load_segments(self, manifest: Dict[str, Any]):
+        """Replay the segment log: each segment's deletes, then its rows."""
+        matrices = []
+        alive: List[bool] = []
+        self._sparse = manifest.get("layout") == "sparse"
+        sparse_dim = (manifest.get("dim") or 0) if self._sparse else None
+        for seg in manifest.get("segments", []):
+            vectors, records = segment_store.load_segment(STORE_DIR, seg["name"], sparse_dim)
+            deleted_ids = []
+            start = len(self.ids)
+            for rec in records:
+                if "delete" in rec:
+                    deleted_ids.append(rec["delete"])
+                    row = self._id_to_row.pop(rec["delete"], None)
+                    if row is not None:
+                        alive[row] = False
+                    continue
+                previous = self._id_to_row.get(rec["id"])
+                if previous is not None:
+                    alive[previous] = False
+                self._id_to_row[rec["id"]] = len(self.ids)
+                self.ids.append(rec["id"])
+                self.texts.append(rec["text"])
+                self.metadatas.append(rec.get("metadata") or {})
+                alive.append(True)
+            # Delete-only segments add no rows; leaving them out keeps a store
+            # with one segment of rows mapped instead of copied
+            if len(self.ids) > start:
+                matrices.append(vectors)
+            self._segments.append(dict(seg, _span=(start, len(self.ids)), _deleted_ids=deleted_ids))
+        if len(matrices) == 1:
+            # Read-only mapping: pages are shared between worker processes
+            self.embeddings = matrices[0]
+        elif matrices and self._sparse:
+            self.embeddings = CSRMatrix.concat(matrices)
+        elif matrices:
+            self.embeddings = np.concatenate(matrices).astype(np.float32, copy=False)
+        self._alive = np.array(alive, dtype=bool)
+        self._dead = int(self._alive.size - np.count_nonzero(self._alive))
+        self.dim = manifest.get("dim") or None
+        self.embed_model = manifest.get("embed_model")
+        self._generation = int(manifest.get("generation", 0))
+        self._next_segment = int(manifest.get("next_segment", self._generation + 1))
+
+    def _migrate_legacy_store(self):
+        data = np.load(STORE_FILE)
+        # Legacy stores hold dense (Google) vectors
+        self._sparse = False
+        # Rows are kept L2-normalized so search is a single dot product
+        self.embeddings = _normalize_rows(data["embeddings"])
+        with META_FILE.open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.texts = meta.get("texts", [])
+        self.metadatas = meta.get("metadatas", [])
+        self.ids = meta.get("ids", [])
+        self.dim = int(self.embeddings.shape[1]) if self.embeddings.size else None
+        self._alive = np.ones(len(self.ids), dtype=bool)
+        for row, id_ in enumerate(self.ids):
+            self._kill_id(id_)
+            self._id_to_row[id_] = row
+        with self._write_lock:
+            self._append_segment(0, len(self.ids))
+        for legacy in (STORE_FILE, META_FILE):
+            legacy.unlink()
+
+    def _records(self, start: int, end: int, live_only: bool = False):
+        return (
+            {"id": self.ids[i], "text": self.texts[i], "metadata": self.metadatas[i]}
+            for i in range(start, end)
+            if not live_only or self._alive[i]
+        )
+
+    def _write_new_segment(self, vectors: np.ndarray, records) -> Dict[str, Any]:
+        name = segment_store.segment_name(self._next_segment)
+        self._next_segment += 1
+        count = segment_store.write_segment(STORE_DIR, name, vectors, records, dtype=STORE_DTYPE)
+        return {"name": name, "count": count}
+
+    def _publish(self):
+        """Make the current segment list the next on-disk generation."""
+        self._generation += 1
+        segment_store.write_manifest(STORE_DIR, {
+            "generation": self._generation,
+            "next_segment": self._next_segment,
+            "dim": self.dim or 0,
+            "dtype": STORE_DTYPE,
+            "layout": "sparse" if self._sparse else "dense",
+            "embed_model": self.embed_model,
+            # Keys starting with "_" are in-memory bookkeeping only
+            "segments": [{k: v for k, v in seg.items() if not k.startswith("_")} for seg in self._segments],
+        })
+
+    def _append_segment(self, start: int, end: int, deleted_ids: Optional[List[str]] = None):
+        """Log deletes plus rows ``start..end`` as a new segment; writes only those rows."""
+        deleted_ids = list(deleted_ids or [])
+        vectors = self.embeddings[start:end] if end > start else self._no_vectors()
+        records = [{"delete": id_} for id_ in deleted_ids]
+        records.extend(self._records(start, end))
+        seg = self._write_new_segment(vectors, records)
+        seg["count"] = end - start
+        if deleted_ids:
+            seg["deletes"] = len(deleted_ids)
+        seg["_span"] = (start, end)
+        seg["_deleted_ids"] = deleted_ids
+        self._segments = self._segments + [seg]
+        self._publish()
+
+    def _no_vectors(self) -> Union[np.ndarray, CSRMatrix]:
+        return CSRMatrix.empty(self.dim or 0) if self._sparse else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def _append_rows(self, vecs: np.ndarray):
+        """Append normalized live rows, growing buffers geometrically instead of vstack-ing."""
+        n = len(self.ids)
+        need = n + vecs.shape[0]
+        if self._sparse:
+            # CSRMatrix.append grows its own arrays geometrically
+            self.embeddings = self.embeddings.append(CSRMatrix.from_dense(vecs))
+            backed = self._alive_buf is not None and self._alive.base is self._alive_buf
+        else:
+            backed = self._buffer is not None and (self.embeddings is self._buffer or self.embeddings.base is self._buffer)
+        if not backed or self._alive_buf.shape[0] < need:
+            capacity = max(need, 2 * n, 256)
+            alive = np.zeros(capacity, dtype=bool)
+            if n:
+                alive[:n] = self._alive
+            self._alive_buf = alive
+            if not self._sparse:
+                buffer = np.empty((capacity, vecs.shape[1]), dtype=np.float32)
+                if n:
+                    buffer[:n] = self.embeddings
+                self._buffer = buffer
+        if not self._sparse:
+            self._buffer[n:need] = vecs
+            self.embeddings = self._buffer[:need]
+        self._alive_buf[n:need] = True
+        self._alive = self._alive_buf[:need]
+
+    def _kill_id(self, id_: str) -> bool:
+        """Tombstone the live row for ``id_``; returns whether one existed."""
+        row = self._id_to_row.pop(id_, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self._dead += 1
+        return True
+
+    def compact(self, first: int = 0):
+        """
+        Merge segment files ``first..end`` into one (the whole store by default).
+        Rows appended while the merge runs are kept as newer segments.
+        """
+        # One merge at a time; appends only ever add segments at the end
+        with self._compact_lock:
+            with self._write_lock:
+                merged = self._segments[first:]
+                if not merged or (len(merged) == 1 and not self._has_garbage(merged[0], first == 0)):
+                    return
+                start, end = merged[0]["_span"][0], merged[-1]["_span"][1]
+                # Tombstoned rows are dropped; deletes that may target rows in
+                # earlier, unmerged segments must survive a tail-only merge
+                deleted_ids = [] if first == 0 else list(dict.fromkeys(
+                    id_ for seg in merged for id_ in seg["_deleted_ids"]
+                ))
+                keep = np.flatnonzero(self._alive[start:end]) + start
+                vectors = self.embeddings[keep] if keep.size else self._no_vectors()
+                records = [{"delete": id_} for id_ in deleted_ids]
+                records.extend(self._records(start, end, live_only=True))
+                name = segment_store.segment_name(self._next_segment)
+                self._next_segment += 1
+
+            # Rows below ``end`` are never modified, so the merge runs unlocked
+            segment_store.write_segment(STORE_DIR, name, vectors, records, dtype=STORE_DTYPE)
+            count = int(keep.size)
+
+            with self._write_lock:
+                seg = {"name": name, "count": count}
+                if deleted_ids:
+                    seg["deletes"] = len(deleted_ids)
+                # In memory the merged rows keep their positions until the next connect()
+                seg["_span"] = (start, end)
+                seg["_deleted_ids"] = deleted_ids
+                self._segments = self._segments[:first] + [seg] + self._segments[first + len(merged):]
+                self._publish()
+            for old_seg in merged:
+                segment_store.remove_segment(STORE_DIR, old_seg["name"])
+            logger.info(f"🗜️ Compacted {len(merged)} vector store segments into {name} ({count} rows)")
+
+    def _has_garbage(self, seg: Dict[str, Any], drop_deletes: bool) -> bool:
+        """Whether rewriting ``seg`` alone would drop tombstoned rows or delete records."""
+        start, end = seg["_span"]
+        return seg["count"] > np.count_nonzero(self._alive[start:end]) or (drop_deletes and bool(seg["_deleted_ids"]))
+
+    def _maybe_compact(self):
+        """
+        Schedule a background merge. The whole store is merged once the tail
+        has grown as large as the base segment, or once tombstoned rows exceed
+        RAG_COMPACT_DEAD_RATIO of the rows on disk; before that, too many tail
+        files are merged size-tiered (a segment joins the newest run only if
+        it is no larger than the run), so each row is rewritten O(log n) times.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        segments = self._segments
+        if not segments:
+            return
+        disk_rows = sum(seg["count"] for seg in segments)
+        tail_rows = disk_rows - segments[0]["count"]
+        if disk_rows - len(self._id_to_row) > COMPACT_DEAD_RATIO * disk_rows:
+            # Enough tombstoned rows on disk to be worth dropping
+            first = 0
+        elif len(segments) < 2:
             return
-        if self.embeddings.size == 0:
-            # Ensure 2D empty array
-            arr = np.zeros((0, self.dim or 0), dtype=np.float32)
+        elif tail_rows >= segments[0]["count"]:
+            first = 0
+        elif len(segments) - 1 > COMPACT_MAX_SEGMENTS:
+            first = len(segments) - 1
+            run_rows = segments[first]["count"]
+            while first > 1 and segments[first - 1]["count"] <= run_rows:
+                first -= 1
+                run_rows += segments[first]["count"]
+            if first == len(segments) - 1:
+                return
         else:
-            arr = self.embeddings
-        np.savez_compressed(STORE_FILE, embeddings=arr)
-        with META_FILE.open("w", encoding="utf-8") as f:
-            json.dump({
-                "texts": self.texts,
-                "metadatas": self.metadatas,
-                "ids": self.ids
-            }, f)
-
-    def _hash_embed(self, text: str, dim: int = 1024) -> List[float]:
-        import re
-        vec = np.zeros(dim, dtype=np.float32)
-        tokens = re.findall(r"[a-z0-9]+", text.lower())
-        for tok in tokens:
-            idx = (hash(tok) & 0x7FFFFFFF) % dim
-            vec[idx] += 1.0
-        norm = np.linalg.norm(vec)
-        if norm > 0:
-            vec = vec / norm
-        return vec.tolist()
+            return
+        self._compactor = threading.Thread(
+            target=self._run_compaction, args=(first,), name="vectorstore-compaction"
+        )
+        self._compactor.start()
+
+    def _run_compaction(self, first: int):
+        try:
+            self.compact(first)
+        except Exception as e:
+            logger.error(f"❌ Vector store compaction failed: {e}", exc_info=True)
+
+    def wait_for_compaction(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
 
     def _google_embed(self, texts: List[str]) -> List[List[float]]:
-        if not API_KEY:
-            raise RuntimeError("GOOGLE_API_KEY not set; required for Google embedding backend")
-        import google.generativeai as genai
-        genai.configure(api_key=API_KEY)
-        vectors: List[List[float]] = []
-        for t in texts:
-            res = genai.embed_content(model=DEFAULT_EMBED_MODEL, content=t)
-            vec = res.get("embedding") or res.get("data", {}).get("embedding")
-            if vec is None:
-                raise RuntimeError("Failed to get embedding from Google API response")
-            vectors.append(vec)
-        return vectors
+        if self._google_embedder is None:
+            # The "stub" backend exercises the same batching/retry path offline
+            self._google_embedder = GoogleBatchEmbedder(
+                DEFAULT_EMBED_MODEL,
+                api_key=API_KEY,
+                embed_fn=StubEmbedContent() if EMBED_BACKEND == "stub" else None,
+                batch_size=EMBED_BATCH_SIZE,
+                max_workers=EMBED_WORKERS,
+                max_retries=EMBED_MAX_RETRIES,
+            )
+        return self._google_embedder.embed(texts)
 
-    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
-        if EMBED_BACKEND == "google":
+    def _embed_uncached(self, texts: List[str]) -> List[Any]:
+        if EMBED_BACKEND in ("google", "stub"):
             return self._google_embed(texts)
         # default local hashing
-        return [self._hash_embed(t) for t in texts]
+        return list(_HASHER.transform(texts))
+
+    def _get_embed_cache(self) -> Optional[EmbeddingCache]:
+        if EMBED_CACHE == "off":
+            return None
+        if self._embed_cache is None:
+            remote = EMBED_BACKEND in ("google", "stub")
+            use_disk = EMBED_CACHE == "disk" or (EMBED_CACHE == "auto" and remote)
+            self._embed_cache = EmbeddingCache(
+                EMBED_CACHE_FILE if use_disk else None,
+                memory_items=EMBED_CACHE_MEMORY_ITEMS,
+                max_disk_bytes=EMBED_CACHE_MAX_MB * 1024 * 1024,
+            )
+        return self._embed_cache
+
+    def _embed_batch(self, texts: List[str]) -> List[Any]:
+        """Embed ``texts``, only sending cache misses (deduplicated) to the backend."""
+        cache = self._get_embed_cache()
+        if cache is None:
+            return self._embed_uncached(texts)
+        vectors = cache.get_many(EMBED_MODEL_ID, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self._embed_uncached(missing)))
+            cache.put_many(EMBED_MODEL_ID, missing, [fresh[t] for t in missing])
+            vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+        return vectors
 
     def add_documents(self, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Add chunks; a chunk whose id already exists replaces the stored one."""
+        self.upsert(ids=ids, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> int:
+        """
+        Insert or replace chunks by id and return how many rows were written.
+        Identical chunks are skipped, and chunks whose text is unchanged reuse
+        their stored vector, so only new or edited text is embedded.
+        """
         if not self._connected:
             self.connect()
         if len(documents) != len(metadatas) or len(documents) != len(ids):
             raise ValueError("documents, metadatas, ids must have same length")
 
-        vectors = self._embed_batch(documents)
-        vecs = np.array(vectors, dtype=np.float32)
-        if self.dim is None:
-            self.dim = vecs.shape[1]
-        if self.embeddings is None or self.embeddings.size == 0:
-            self.embeddings = vecs
-        else:
-            self.embeddings = np.vstack([self.embeddings, vecs])
-        self.texts.extend(documents)
-        self.metadatas.extend(metadatas)
-        self.ids.extend(ids)
-        self._persist()
+        # The last occurrence of an id repeated within the batch wins
+        latest = {id_: pos for pos, id_ in enumerate(ids)}
+        changed: List[int] = []
+        reuse: Dict[int, int] = {}
+        for pos, id_ in enumerate(ids):
+            if latest[id_] != pos:
+                continue
+            row = self._id_to_row.get(id_)
+            if row is not None and self.texts[row] == documents[pos]:
+                if self.metadatas[row] == metadatas[pos]:
+                    continue
+                reuse[pos] = row
+            changed.append(pos)
+        if not changed:
+            return 0
+
+        to_embed = [pos for pos in changed if pos not in reuse]
+        embedded = None
+        if to_embed:
+            embedded = _normalize_rows(np.array(self._embed_batch([documents[pos] for pos in to_embed]), dtype=np.float32))
+
+        with self._write_lock:
+            dim = embedded.shape[1] if embedded is not None else self.dim
+            if self.dim is None:
+                self.dim = dim
+                self.embed_model = EMBED_MODEL_ID
+            elif dim != self.dim:
+                raise ValueError(f"Embedding dimension {dim} does not match store dimension {self.dim}")
+            vecs = np.empty((len(changed), dim), dtype=np.float32)
+            slot = {pos: i for i, pos in enumerate(changed)}
+            if embedded is not None:
+                vecs[[slot[pos] for pos in to_embed]] = embedded
+            if reuse:
+                # Stored rows are never modified, so tombstoned ones are still valid
+                vecs[[slot[pos] for pos in reuse]] = np.asarray(self.embeddings[list(reuse.values())])
+
+            for pos in changed:
+                self._kill_id(ids[pos])
+            start = len(self.ids)
+            self._append_rows(vecs)
+            new_metadatas = [metadatas[pos] for pos in changed]
+            self._index_metadata(start, new_metadatas)
+            self.texts.extend(documents[pos] for pos in changed)
+            self.metadatas.extend(new_metadatas)
+            for pos in changed:
+                self._id_to_row[ids[pos]] = len(self.ids)
+                self.ids.append(ids[pos])
+            if self._bm25 is not None:
+                self._bm25.add(self.texts[start:])
+            if self._schemes is not None:
+                self._schemes.add(new_metadatas)
+            # Replay supersedes older rows with the same id, so no delete records
+            self._append_segment(start, len(self.ids))
+            self.version = next(_content_versions)
+        self._maybe_compact()
+        return len(changed)
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstone chunks by id and return how many existed."""
+        if not self._connected:
+            self.connect()
+        with self._write_lock:
+            deleted = [id_ for id_ in dict.fromkeys(ids) if self._kill_id(id_)]
+            if deleted:
+                self._append_segment(len(self.ids), len(self.ids), deleted)
+                self.version = next(_content_versions)
+        if deleted:
+            self._maybe_compact()
+        return len(deleted)
 
-    def _cosine_sim(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
-        a_norm = a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-12)
-        b_norm = b / (np.linalg.norm(b, axis=1, keepdims=True) + 1e-12)
-        return a_norm @ b_norm.T
+    def get(self, ids: List[str]) -> Dict[str, List[Any]]:
+        """Stored chunks for ``ids`` (unknown ids are left out), like Chroma's collection.get()."""
+        if not self._connected:
+            self.connect()
+        with self._write_lock:
+            rows = [self._id_to_row[id_] for id_ in ids if id_ in self._id_to_row]
+            return {
+                "ids": [self.ids[i] for i in rows],
+                "documents": [self.texts[i] for i in rows],
+                "metadatas": [self.metadatas[i] for i in rows],
+            }
+
+    def get_ids(self, filter_metadata: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Ids of live chunks, optionally restricted by a metadata filter."""
+        if not self._connected:
+            self.connect()
+        rows = self._filter_rows(filter_metadata)
+        if rows is None:
+            return list(self._id_to_row)
+        return [self.ids[i] for i in rows[self._alive[rows]]]
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        return _normalize_rows(np.array(self._embed_batch(queries), dtype=np.float32))
+
+    def _filter_rows(self, filter_metadata: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Row indices matching ``filter_metadata``, or None when unfiltered.
+        Conditions on different fields are ANDed, e.g.
+        {"source": {"$in": ["a.pdf", "b.pdf"]}, "page": {"$gte": 3, "$lte": 10}}
+        """
+        if not filter_metadata:
+            return None
+        rows: Optional[np.ndarray] = None
+        # Intersect the shortest posting lists first
+        for arr in sorted((self._match_rows(k, v) for k, v in filter_metadata.items()), key=len):
+            rows = arr if rows is None else np.intersect1d(rows, arr, assume_unique=True)
+            if rows.size == 0:
+                break
+        return rows
 
     def search(self, query: str, n_results: int = 3, filter_metadata: Optional[Dict[str, Any]] = None):
+        return self.search_many([query], n_results=n_results, filter_metadata=filter_metadata)
+
+    def search_many(self, queries: List[str], n_results: int = 3, filter_metadata: Optional[Dict[str, Any]] = None):
+        """
+        Top-k search for a batch of queries with one matrix-matrix product.
+        Returns the usual result dict with one inner list per query.
+        """
+        if not self._connected:
+            self.connect()
+        empty = {"documents": [[] for _ in queries], "metadatas": [[] for _ in queries], "ids": [[] for _ in queries]}
+        live = len(self._id_to_row)
+        if not queries or self.embeddings is None or self.embeddings.size == 0 or not live:
+            return empty
+
+        rows = self._filter_rows(filter_metadata)
+        if rows is not None:
+            if self._dead:
+                rows = rows[self._alive[rows]]
+            if rows.size == 0:
+                return empty
+            live = rows.size
+
+        qvecs = self._embed_queries(queries)
+        k = min(max(1, n_results), live)
+        return self._rows_result(self._dense_top_k(qvecs, k, rows, live))
+
+    def _rows_result(self, top) -> Dict[str, List[List[Any]]]:
+        result = {"documents": [], "metadatas": [], "ids": []}
+        for row_idx in top:
+            result["documents"].append([self.texts[i] for i in row_idx])
+            result["metadatas"].append([self.metadatas[i] for i in row_idx])
+            result["ids"].append([self.ids[i] for i in row_idx])
+        return result
+
+    def _dense_top_k(self, qvecs: np.ndarray, k: int, rows: Optional[np.ndarray], live: int) -> List[np.ndarray]:
+        """Best ``k`` live rows (restricted to ``rows`` if given) per query vector."""
+        ann = self._ann_index() if live >= ANN_MIN_ROWS else None
+        if ann is not None:
+            top = [self._ann_top_k(ann, qvec, k, rows) for qvec in qvecs]
+        elif VECTOR_STORAGE == "int8" and not self._sparse:
+            top = self._quantized_top_k(qvecs, k, rows)
+        else:
+            if self._sparse:
+                sims = self.embeddings.column_dot(qvecs, rows)
+            else:
+                matrix = self.embeddings if rows is None else self.embeddings[rows]
+                # Stored rows are unit-length, so cosine similarity is a plain product
+                sims = _score(qvecs, matrix)
+            if rows is None and self._dead:
+                sims[:, ~self._alive] = -np.inf
+            top = _top_k(sims, k)
+            if rows is not None:
+                top = rows[top]
+        return list(top)
+
+    def hybrid_search(self, query: str, n_results: int = 3, filter_metadata: Optional[Dict[str, Any]] = None,
+                      lexical_query: Optional[str] = None):
+        """
+        Vector search fused with BM25 by reciprocal rank, so exact tokens such
+        as scheme ids, helpline numbers and error codes rank even when the
+        embedding misses them. ``lexical_query`` (default ``query``) lets
+        callers keep keyword padding meant for the embedding out of BM25.
+        """
+        return self.hybrid_search_many([query], n_results, filter_metadata,
+                                       None if lexical_query is None else [lexical_query])
+
+    def hybrid_search_many(self, queries: List[str], n_results: int = 3,
+                           filter_metadata: Optional[Dict[str, Any]] = None,
+                           lexical_queries: Optional[List[Optional[str]]] = None):
+        """
+        hybrid_search() for a batch of queries sharing one filter: one
+        embedding call and one matrix-matrix product for the dense side.
+        Returns the usual result dict with one inner list per query.
+        """
+        if not self._connected:
+            self.connect()
+        empty = {"documents": [[] for _ in queries], "metadatas": [[] for _ in queries], "ids": [[] for _ in queries]}
+        live = len(self._id_to_row)
+        if not queries or self.embeddings is None or self.embeddings.size == 0 or not live:
+            return empty
+        if lexical_queries is not None and len(lexical_queries) != len(queries):
+            raise ValueError("queries and lexical_queries must have same length")
+
+        rows = self._filter_rows(filter_metadata)
+        if rows is not None:
+            if self._dead:
+                rows = rows[self._alive[rows]]
+            if rows.size == 0:
+                return empty
+            live = rows.size
+
+        k = min(max(1, n_results), live)
+        n_cand = min(max(k * HYBRID_CANDIDATES, _HYBRID_MIN_CANDIDATES), live)
+        dense_top = self._dense_top_k(self._embed_queries(queries), n_cand, rows, live)
+        lexical = self._lexical_index()
+
+        top = []
+        for i, (query, dense) in enumerate(zip(queries, dense_top)):
+            # Only rows sharing a term with the query are scored
+            lex_query = (lexical_queries[i] if lexical_queries is not None else None) or query
+            lex_rows, lex_scores = lexical.scores(lex_query)
+            keep = self._alive[lex_rows]
+            if rows is not None:
+                keep &= np.isin(lex_rows, rows, assume_unique=True)
+            lex_rows, lex_scores = lex_rows[keep], lex_scores[keep]
+            lex_top = lex_rows[_top_k(lex_scores, n_cand)] if lex_rows.size else lex_rows
+
+            fused: Dict[int, float] = {}
+            for ranked in (dense, lex_top):
+                for rank, row in enumerate(ranked.tolist()):
+                    fused[row] = fused.get(row, 0.0) + 1.0 / (HYBRID_RRF_K + rank + 1)
+            top.append(sorted(fused, key=fused.get, reverse=True)[:k])
+        return self._rows_result(top)
+
+    def _lexical_index(self) -> BM25Index:
+        """
+        The BM25 index, built over every row on first use and then kept
+        current by upsert(). Tombstoned rows stay in the term statistics
+        until the next connect() after compaction.
+        """
+        if self._bm25 is not None:
+            return self._bm25
+        with self._write_lock:
+            if self._bm25 is None:
+                index = BM25Index()
+                index.add(self.texts)
+                self._bm25 = index
+                logger.info(f"🔤 Built BM25 index over {index.size} chunks")
+            return self._bm25
+
+    def _ann_index(self) -> Optional[IVFFlatIndex]:
+        """
+        The IVF index if one is ready, catching it up with appended rows.
+        Training runs in a background thread (also after 4x growth);
+        searches stay exact until it finishes.
+        """
+        if ANN_INDEX != "ivf":
+            return None
+        n = len(self.ids)
+        ann = self._ann
+        if ann is not None and ann.size > n:
+            ann = self._ann = None
+        if ann is None or n > 4 * ann.trained_rows:
+            if self._ann_builder is None or not self._ann_builder.is_alive():
+                self._ann_builder = threading.Thread(
+                    target=self._build_ann, args=(self._ann_epoch,), name="vectorstore-ann-build"
+                )
+                self._ann_builder.start()
+        if ann is None:
+            return None
+        if ann.size < n:
+            with self._ann_lock:
+                if ann.size < n:
+                    ann.add(self.embeddings[ann.size:n])
+        return ann
+
+    def _build_ann(self, epoch: int):
+        try:
+            n = len(self.ids)
+            n_lists = ANN_LISTS or int(4 * np.sqrt(n))
+            index = IVFFlatIndex(n_lists)
+            index.train(self.embeddings[:n])
+            if epoch == self._ann_epoch:
+                self._ann = index
+                logger.info(f"🧭 Built IVF index: {index.n_lists} lists over {n} rows")
+        except Exception as e:
+            logger.error(f"❌ IVF index build failed: {e}", exc_info=True)
+
+    def _ann_top_k(self, ann: IVFFlatIndex, qvec: np.ndarray, k: int, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Top-k among the probed lists, probing wider if too few rows survive
+        filters. With int8 storage the candidates are shortlisted on their
+        codes and only the shortlist is scored with the exact vectors.
+        """
+        nprobe = ANN_NPROBE
+        while True:
+            cand = ann.probe(qvec, nprobe)
+            if self._dead:
+                cand = cand[self._alive[cand]]
+            if rows is not None:
+                cand = cand[np.isin(cand, rows, assume_unique=True)]
+            if cand.size >= k or nprobe >= ann.n_lists:
+                break
+            nprobe *= 2
+        if VECTOR_STORAGE == "int8" and not self._sparse:
+            codes = self._sync_codes()
+            approx = self._quantizer.score(qvec[None, :], codes[cand])[0]
+            cand = np.sort(cand[_top_k(approx, max(k * RERANK_FACTOR, _RERANK_MIN))])
+        sims = _score(qvec[None, :], self.embeddings[cand])[0]
+        return cand[_top_k(sims, k)]
+
+    def _sync_codes(self) -> np.ndarray:
+        """Int8 codes for every row, refitting the scales after 4x growth."""
+        n = len(self.ids)
+        with self._codes_lock:
+            if self._quantizer is None or n > 4 * self._quant_fit_rows:
+                rng = np.random.default_rng(0)
+                sample = np.sort(rng.choice(n, min(n, _QUANT_SAMPLE_ROWS), replace=False))
+                self._quantizer = Int8Quantizer().fit(self.embeddings[sample])
+                self._quant_fit_rows = n
+                self._codes_n = 0
+            if self._codes_n < n:
+                if self._codes_buf is None or self._codes_buf.shape[0] < n:
+                    buffer = np.empty((max(n, 2 * self._codes_n), self.embeddings.shape[1]), dtype=np.int8)
+                    if self._codes_n:
+                        buffer[:self._codes_n] = self._codes_buf[:self._codes_n]
+                    self._codes_buf = buffer
+                self._codes_buf[self._codes_n:n] = self._quantizer.encode(self.embeddings[self._codes_n:n])
+                self._codes_n = n
+            return self._codes_buf[:n]
+
+    def _quantized_top_k(self, qvecs: np.ndarray, k: int, rows: Optional[np.ndarray]) -> List[np.ndarray]:
+        """Shortlist on int8 codes, then re-rank the shortlist with exact vectors."""
+        codes = self._sync_codes()
+        approx = self._quantizer.score(qvecs, codes if rows is None else codes[rows])
+        if rows is None and self._dead:
+            approx[:, ~self._alive[:codes.shape[0]]] = -np.inf
+        shortlist = _top_k(approx, max(k * RERANK_FACTOR, _RERANK_MIN))
+        if rows is not None:
+            shortlist = rows[shortlist]
+        top = []
+        for qvec, cand in zip(qvecs, shortlist):
+            # Sorted rows keep the reads from the mapped file sequential
+            cand = np.sort(cand)
+            if self._dead:
+                cand = cand[self._alive[cand]]
+            sims = _score(qvec[None, :], self.embeddings[cand])[0]
+            top.append(cand[_top_k(sims, k)])
+        return top
+
+    def lookup_scheme(self, scheme_id_or_name: str) -> Dict[str, List[List[Any]]]:
+        """
+        Every live chunk of the scheme(s) named by an id, name or alias
+        (fuzzy-matched if need be), in ingestion order. No embedding call;
+        empty lists if no scheme matches.
+        """
         if not self._connected:
             self.connect()
-        if self.embeddings is None or self.embeddings.size == 0 or not self.texts:
-            return {"documents": [[]], "metadatas": [[]], "ids": [[]]}
-
-        qvec = np.array(self._embed_batch([query])[0], dtype=np.float32)[None, :]
-        sims = self._cosine_sim(qvec, self.embeddings)[0]
-
-        # Apply metadata filters by masking
-        indices = np.arange(len(self.texts))
-        if filter_metadata:
-            mask = []
-            for i, md in enumerate(self.metadatas):
-                ok = True
-                for k, v in filter_metadata.items():
-                    if md.get(k) != v:
-                        ok = False
-                        break
-                mask.append(ok)
-            indices = indices[np.array(mask, dtype=bool)]
-            sims = sims[np.array(mask, dtype=bool)]
-
-        if sims.size == 0:
-            return {"documents": [[]], "metadatas": [[]], "ids": [[]]}
-
-        topk = int(max(1, min(n_results, sims.shape[0])))
-        top_idx = indices[np.argsort(-sims)[:topk]]
-
-        docs = [self.texts[i] for i in top_idx]
-        metas = [self.metadatas[i] for i in top_idx]
-        ids = [self.ids[i] for i in top_idx]
-        return {"documents": [docs], "metadatas": [metas], "ids": [ids]}
+        scheme_ids = self._scheme_index().resolve(scheme_id_or_name)
+        rows = self._union_postings("scheme_id", scheme_ids)
+        return self._rows_result([rows[self._alive[rows]]])
+
+    def _scheme_index(self) -> SchemeLookupIndex:
+        if self._schemes is not None:
+            return self._schemes
+        with self._write_lock:
+            if self._schemes is None:
+                index = SchemeLookupIndex()
+                index.add(self.metadatas)
+                self._schemes = index
+            return self._schemes
 
     def search_by_error_code(self, error_code: str) -> str:
         # Specialized helper: bias query towards error code semantics
@@ -174,9 +1036,15 @@ class _VectorStoreClient:
 
     def get_collection_stats(self) -> Dict[str, Any]:
         return {
-            "backend": f"numpy-{'google' if EMBED_BACKEND=='google' else 'local'}",
-            "count": len(self.texts),
+            "backend": f"numpy-{EMBED_BACKEND if EMBED_BACKEND in ('google', 'stub') else 'local'}",
+            "count": len(self._id_to_row),
+            "tombstones": self._dead,
+            "ann_lists": self._ann.n_lists if self._ann is not None else 0,
+            "vector_storage": "sparse" if self._sparse else VECTOR_STORAGE,
+            "vector_bytes": int(self.embeddings.nbytes) if self.embeddings is not None else 0,
+            "embed_cache": self._embed_cache.stats() if self._embed_cache is not None else None,
             "dim": self.dim or 0,
+            "embed_model": self.embed_model,
             "store_dir": str(STORE_DIR)
         }
 
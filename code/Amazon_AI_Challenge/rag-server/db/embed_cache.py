@@ -0,0 +1,150 @@
+"""
+Content-addressed embedding cache
+
+Vectors are keyed by sha256(model, text). Lookups go through an in-memory
+LRU first and then, optionally, a SQLite file shared across runs and worker
+processes. The SQLite tier is evicted least-recently-used once it grows
+past its byte budget.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[Path] = None, memory_items: int = 4096,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            self._disk_bytes = self._db.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _remember(self, key: bytes, vec: np.ndarray):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [cache_key(model, t) for t in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            disk_lookup = []
+            for i, key in enumerate(keys):
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vec
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.append(i)
+
+            if disk_lookup and self._db is not None:
+                wanted = list({keys[i] for i in disk_lookup})
+                rows: Dict[bytes, np.ndarray] = {}
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(wanted), 500):
+                    chunk = wanted[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    for key, blob in self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk
+                    ):
+                        rows[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    now = time.time()
+                    with self._transaction():
+                        self._db.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in rows]
+                        )
+                for i in disk_lookup:
+                    vec = rows.get(keys[i])
+                    if vec is not None:
+                        found[i] = vec
+                        self._remember(keys[i], vec)
+                        self.disk_hits += 1
+            self.misses += sum(1 for v in found if v is None)
+        return found
+
+    def put_many(self, model: str, texts: List[str], vectors: List[Any]):
+        entries = []
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = cache_key(model, text)
+                arr = np.asarray(vec, dtype=np.float32)
+                self._remember(key, arr)
+                entries.append((key, arr.tobytes()))
+            if self._db is None or not entries:
+                return
+            now = time.time()
+            with self._transaction():
+                for key, blob in entries:
+                    cur = self._db.execute(
+                        "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                        (key, blob, now),
+                    )
+                    if cur.rowcount > 0:
+                        self._disk_bytes += len(blob)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used rows until the file is ~10% under budget."""
+        target = int(self.max_disk_bytes * 0.9)
+        while self._disk_bytes > target:
+            victims = self._db.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not victims:
+                break
+            self._db.executemany("DELETE FROM embeddings WHERE key = ?", [(k,) for k, _ in victims])
+            self._disk_bytes -= sum(size for _, size in victims)
+        self._disk_bytes = max(self._disk_bytes, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes if self._db is not None else 0,
+        }
@@ -0,0 +1,280 @@
+"""
+Embedding backends for the vector store
+
+HashingVectorizer is the offline "local" backend: feature hashing with a
+stable hash, so vectors are identical across processes and restarts.
+GoogleBatchEmbedder sends texts to ``genai.embed_content`` in multi-content
+batches from a bounded thread pool, retrying rate-limit and transient errors
+with jittered exponential backoff. StubEmbedContent is a drop-in stand-in for
+``genai.embed_content`` that simulates latency and 429s without the network.
+"""
+import logging
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                    "DeadlineExceeded", "InternalServerError", "RateLimitError"}
+
+
+# Hash constants: tokens of an n-gram and 8-byte words of a long feature are
+# combined as a polynomial in _HASH_BASE; salts keep feature kinds apart
+_HASH_BASE = np.uint64(0x9E3779B97F4A7C15)
+_WORD_SALT = 0xA0761D6478BD642F
+_CHAR_SALT = 0xE7037ED1A0B428DB
+# Little-endian masks keeping the first r bytes of a 64-bit word
+_LOW_BYTES = np.array([(1 << (8 * r)) - 1 for r in range(9)], dtype=np.uint64)
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so every input bit reaches the low bits used as the column."""
+    h = h ^ (h >> np.uint64(30))
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def _hash_spans(buf: np.ndarray, starts: np.ndarray, lens: np.ndarray) -> np.ndarray:
+    """
+    64-bit hashes of the byte spans ``buf[start:start + len]`` (``buf`` must
+    end in 8 padding bytes). Spans are read 8 bytes at a time through an
+    overlapping view, so a span of up to 8 bytes is one gather; longer spans add
+    one step per further 8 bytes, over the spans that long only.
+    """
+    # The little-endian 64-bit word starting at every byte (an unaligned view)
+    words = np.ndarray(shape=(buf.size - 7,), dtype="<u8", buffer=buf, strides=(1,))
+    hashes = words[starts] & _LOW_BYTES[np.minimum(lens, 8)]
+    offset = 8
+    longer = np.flatnonzero(lens > offset)
+    while longer.size:
+        word = words[starts[longer] + offset] & _LOW_BYTES[np.minimum(lens[longer] - offset, 8)]
+        hashes[longer] = hashes[longer] * _HASH_BASE + word
+        offset += 8
+        longer = longer[lens[longer] > offset]
+    return _mix64(hashes + lens.astype(np.uint64))
+
+
+class HashingVectorizer:
+    """
+    Batched feature-hashing embedder. Features are lower-cased ASCII
+    alphanumeric tokens, optionally word n-grams up to ``word_ngrams`` and
+    character ``char_ngrams``-grams of each token ("<" and ">" mark its ends).
+
+    The whole batch is tokenized and hashed with array operations over its
+    UTF-8 bytes, with no Python loop per token or feature: token boundaries
+    come from a byte-class mask, tokens are hashed by _hash_spans(), n-grams
+    by combining their token hashes, and counts are scattered into the
+    output matrix with a single bincount.
+    """
+
+    def __init__(self, dim: int = 1024, word_ngrams: int = 1, char_ngrams: int = 0):
+        self.dim = dim
+        self.word_ngrams = max(1, word_ngrams)
+        self.char_ngrams = max(0, char_ngrams)
+
+    @property
+    def model_id(self) -> str:
+        return f"local-hash-v3-{self.dim}-w{self.word_ngrams}-c{self.char_ngrams}"
+
+    def _char_grams(self, buf: np.ndarray, starts: np.ndarray, lens: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashes of the character n-grams of every token and the token each belongs to."""
+        n = self.char_ngrams
+        count = lens.size
+        # Each token as "<token>", back to back, followed by hash padding
+        padded_lens = lens + 2
+        padded_starts = np.zeros(count, dtype=np.int64)
+        padded_starts[1:] = np.cumsum(padded_lens)[:-1]
+        total = int(padded_starts[-1] + padded_lens[-1])
+        padded = np.zeros(total + 8, dtype=np.uint8)
+        padded[padded_starts] = ord("<")
+        padded[padded_starts + padded_lens - 1] = ord(">")
+        char_tokens = np.repeat(np.arange(count, dtype=np.int64), lens)
+        chars = np.arange(char_tokens.size, dtype=np.int64)
+        # Token t's bytes sit 2t + 1 further on than in the concatenated tokens
+        padded[chars + 2 * char_tokens + 1] = buf[starts[char_tokens] + chars - (padded_starts[char_tokens] - 2 * char_tokens)]
+
+        grams = np.maximum(padded_lens - n + 1, 0)
+        gram_tokens = np.repeat(np.arange(count, dtype=np.int64), grams)
+        if not gram_tokens.size:
+            return np.zeros(0, dtype=np.uint64), gram_tokens
+        first_grams = np.zeros(count, dtype=np.int64)
+        first_grams[1:] = np.cumsum(grams)[:-1]
+        gram_starts = padded_starts[gram_tokens] + np.arange(gram_tokens.size, dtype=np.int64) - first_grams[gram_tokens]
+        hashes = _hash_spans(padded, gram_starts, np.full(gram_tokens.size, n, dtype=np.int64))
+        return _mix64(hashes + np.uint64(_CHAR_SALT)), gram_tokens
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """L2-normalized float32 matrix with one row per text."""
+        # Texts are separated (and the buffer started) by a newline and the
+        # buffer ends in 8 padding bytes, so no token touches either end
+        encoded = [text.lower().encode("utf-8") for text in texts]
+        buf = np.frombuffer(b"\n".join([b""] + encoded + [b"\n" * 8]), dtype=np.uint8)
+        text_ends = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)) + 1)
+
+        mask = ((buf - np.uint8(ord("a"))) < 26) | ((buf - np.uint8(ord("0"))) < 10)
+        edges = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+        starts, ends = edges[0::2], edges[1::2]
+        rows, cols = [], []
+        if starts.size:
+            lens = ends - starts
+            token_rows = np.repeat(np.arange(len(texts), dtype=np.int64),
+                                   np.diff(np.searchsorted(starts, text_ends), prepend=0))
+            token_hashes = _hash_spans(buf, starts, lens)
+            rows.append(token_rows)
+            cols.append(token_hashes)
+
+            for n in range(2, self.word_ngrams + 1):
+                grams = starts.size - n + 1
+                if grams <= 0:
+                    break
+                hashes = token_hashes[:grams].copy()
+                for k in range(1, n):
+                    hashes = hashes * _HASH_BASE + token_hashes[k:k + grams]
+                # An n-gram never spans two texts
+                valid = token_rows[:grams] == token_rows[n - 1:]
+                rows.append(token_rows[:grams][valid])
+                cols.append(_mix64(hashes[valid] + np.uint64(_WORD_SALT + n)))
+
+            if self.char_ngrams:
+                char_hashes, char_tokens = self._char_grams(buf, starts, lens)
+                rows.append(token_rows[char_tokens])
+                cols.append(char_hashes)
+
+        if not rows:
+            return np.zeros((len(texts), self.dim), dtype=np.float32)
+        flat = np.concatenate(rows) * self.dim + (np.concatenate(cols) % np.uint64(self.dim)).astype(np.int64)
+        out = np.bincount(flat, minlength=len(texts) * self.dim)
+        out = out.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+def _is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if callable(code):
+        # grpc-style errors expose code() rather than an int attribute
+        code = None
+    if code in _RETRYABLE_CODES or type(error).__name__ in _RETRYABLE_NAMES:
+        return True
+    return "429" in str(error)
+
+
+class GoogleBatchEmbedder:
+    def __init__(self, model: str, api_key: Optional[str] = None,
+                 embed_fn: Optional[Callable[..., Dict[str, Any]]] = None,
+                 batch_size: int = 100, max_workers: int = 4, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 30.0):
+        self.model = model
+        self.api_key = api_key
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._embed_fn = embed_fn
+        self._init_lock = threading.Lock()
+
+    def _embed_content(self) -> Callable[..., Dict[str, Any]]:
+        # genai.configure is process-global; do it once, not per batch
+        with self._init_lock:
+            if self._embed_fn is None:
+                if not self.api_key:
+                    raise RuntimeError("GOOGLE_API_KEY not set; required for Google embedding backend")
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._embed_fn = genai.embed_content
+        return self._embed_fn
+
+    def _parse(self, res: Dict[str, Any], expected: int) -> List[List[float]]:
+        vecs = res.get("embedding") or res.get("data", {}).get("embedding")
+        if vecs is None:
+            raise RuntimeError("Failed to get embedding from Google API response")
+        if vecs and not isinstance(vecs[0], (list, tuple)):
+            vecs = [vecs]
+        if len(vecs) != expected:
+            raise RuntimeError(f"Google API returned {len(vecs)} embeddings for {expected} texts")
+        return [list(v) for v in vecs]
+
+    def _embed_one_batch(self, batch: List[str]) -> List[List[float]]:
+        embed_content = self._embed_content()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._parse(embed_content(model=self.model, content=batch), len(batch))
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                self.retries += 1
+                logger.warning(f"⏳ Embedding batch rate-limited/failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_one_batch(batches[0])
+
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        started = time.perf_counter()
+        done = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches)),
+                                thread_name_prefix="embed") as pool:
+            futures = {pool.submit(self._embed_one_batch, batch): i for i, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += len(batches[i])
+                elapsed = time.perf_counter() - started
+                logger.info(f"🧮 Embedded {done}/{len(texts)} texts ({done / max(elapsed, 1e-9):.0f} texts/s)")
+        return [vec for batch in results for vec in batch]
+
+
+class RateLimitError(Exception):
+    code = 429
+
+
+class StubEmbedContent:
+    """
+    Local stand-in for ``genai.embed_content``: deterministic vectors per text,
+    a fixed per-call latency and a fraction of calls failing with HTTP 429.
+    """
+
+    def __init__(self, dim: int = 768, latency: float = 0.05, error_rate: float = 0.0, seed: int = 0):
+        self.dim = dim
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dim).astype(np.float32).tolist()
+
+    def __call__(self, model: str, content: Any, **kwargs) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.rate_limited += 1
+        if fail:
+            raise RateLimitError("429 Resource has been exhausted (e.g. check quota).")
+        if isinstance(content, str):
+            return {"embedding": self._vector(content)}
+        return {"embedding": [self._vector(t) for t in content]}
@@ -0,0 +1,41 @@
+"""
+Int8 scalar quantization for first-pass vector scoring
+
+Each dimension gets its own scale (max |value| / 127, fitted on a sample),
+so a 768-d float32 row shrinks from 3 KB to 768 bytes. Scores computed on
+the codes are only used to shortlist candidates; the vector store re-ranks
+the shortlist with the exact float vectors.
+"""
+from typing import Optional
+
+import numpy as np
+
+# Rows per block when upcasting codes for scoring
+_SCORE_BLOCK_ROWS = 8192
+
+
+class Int8Quantizer:
+    def __init__(self, scale: Optional[np.ndarray] = None):
+        self.scale = scale
+
+    def fit(self, sample: np.ndarray):
+        max_abs = np.max(np.abs(np.asarray(sample, dtype=np.float32)), axis=0)
+        max_abs[max_abs == 0] = 1.0
+        self.scale = (max_abs / 127.0).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, vectors.shape[0], _SCORE_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+            codes[start:start + block.shape[0]] = np.clip(np.rint(block / self.scale), -127, 127)
+        return codes
+
+    def score(self, qvecs: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate ``qvecs @ vectors.T`` from the codes, upcasting block by block."""
+        scaled = (qvecs * self.scale).astype(np.float32)
+        out = np.empty((qvecs.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+            block = codes[start:start + _SCORE_BLOCK_ROWS].astype(np.float32)
+            out[:, start:start + block.shape[0]] = scaled @ block.T
+        return out
@@ -0,0 +1,102 @@
+"""
+Direct scheme lookup for the vector store
+
+Maps normalized scheme ids, names and aliases to ``scheme_id`` metadata
+values, so "PM-KISAN" or "Ayushman Bharat" resolve with one dict lookup and
+no embedding call. Keys are derived from each chunk's ``scheme_id``,
+``scheme_name`` and optional ``aliases`` metadata: the id with and without
+its numeric suffix, the full name, the name without its parenthesised
+acronym, the acronym itself and each " - " separated part of the name.
+Misspelt or partial names fall back to a trigram index over those keys.
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Set
+
+# Dropped from keys and queries alike ("PM Kisan scheme details" -> "pmkisan")
+_NOISE_WORDS = {"the", "scheme", "schemes", "of", "for", "and", "details", "about", "information"}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_ID_SUFFIX_RE = re.compile(r"[-_ ]?\d+$")
+_PAREN_RE = re.compile(r"\(([^)]*)\)")
+
+
+def normalize(text: str) -> str:
+    """Lower-case alphanumerics of ``text`` without noise words, e.g. "PM-KISAN" -> "pmkisan"."""
+    return "".join(w for w in _WORD_RE.findall(text.lower()) if w not in _NOISE_WORDS)
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"${key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def scheme_keys(scheme_id: str, scheme_name: str = "", aliases: Iterable[str] = ()) -> Set[str]:
+    """Every normalized key a scheme should be found under."""
+    names = [scheme_id, _ID_SUFFIX_RE.sub("", scheme_id)]
+    if scheme_name:
+        names.append(scheme_name)
+        names.extend(_PAREN_RE.findall(scheme_name))
+        bare = _PAREN_RE.sub("", scheme_name)
+        names.append(bare)
+        names.extend(bare.split(" - "))
+    names.extend(aliases)
+    return {key for key in map(normalize, names) if key}
+
+
+class SchemeLookupIndex:
+    """Normalized key -> scheme ids, plus a trigram index over the keys."""
+
+    def __init__(self, min_similarity: float = 0.5):
+        self.min_similarity = min_similarity
+        self._schemes: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        self._seen: Set[Any] = set()
+
+    def add(self, metadatas: Iterable[Dict[str, Any]]):
+        for md in metadatas:
+            scheme_id = md.get("scheme_id")
+            if not isinstance(scheme_id, str) or not scheme_id:
+                continue
+            aliases = md.get("aliases") or ()
+            if isinstance(aliases, str):
+                aliases = [aliases]
+            # Chunks of one scheme share their metadata, so each is indexed once
+            signature = (scheme_id, md.get("scheme_name") or "", tuple(aliases))
+            if signature in self._seen:
+                continue
+            self._seen.add(signature)
+            for key in scheme_keys(scheme_id, signature[1], aliases):
+                owners = self._schemes.setdefault(key, set())
+                if not owners:
+                    grams = _trigrams(key)
+                    self._gram_counts[key] = len(grams)
+                    for gram in grams:
+                        self._grams.setdefault(gram, set()).add(key)
+                owners.add(scheme_id)
+
+    def resolve(self, query: str) -> List[str]:
+        """
+        Scheme ids for ``query``: an exact key match, else the keys with the
+        best trigram Jaccard similarity (at least ``min_similarity``), or a
+        key of 6+ characters contained in the query. Empty if nothing fits.
+        """
+        key = normalize(query)
+        if not key:
+            return []
+        exact = self._schemes.get(key)
+        if exact:
+            return sorted(exact)
+
+        grams = _trigrams(key)
+        common = Counter(k for gram in grams for k in self._grams.get(gram, ()))
+        best, matches = 0.0, []
+        for candidate, shared in common.items():
+            score = shared / (len(grams) + self._gram_counts[candidate] - shared)
+            if score < self.min_similarity and not (len(candidate) >= 6 and candidate in key):
+                continue
+            if score > best:
+                best, matches = score, [candidate]
+            elif score == best:
+                matches.append(candidate)
+        return sorted({sid for candidate in matches for sid in self._schemes[candidate]})
@@ -0,0 +1,105 @@
+"""
+On-disk layout for the numpy vector store
+
+    manifest.json      {"format", "generation", "dim", "dtype", "layout", "segments": [...]}
+    seg-000001.npy     raw L2-normalized vectors, opened with mmap_mode='r'
+    seg-000001.jsonl   one {"id", "text", "metadata"} record per vector row
+
+Stores with ``"layout": "sparse"`` keep each segment's vectors as CSR
+arrays instead, in seg-000001.indptr.npy, .indices.npy and .data.npy.
+
+Segment files are immutable once written. A new generation is published by
+atomically replacing manifest.json, so readers (including other worker
+processes) always see a complete, consistent set of files and share the
+same page cache for the mapped vectors.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from db.sparse_matrix import CSRMatrix
+
+FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+SUPPORTED_DTYPES = ("float32", "float16")
+_SPARSE_PARTS = ("indptr", "indices", "data")
+
+
+def segment_name(number: int) -> str:
+    return f"seg-{number:06d}"
+
+
+def read_manifest(store_dir: Path) -> Optional[Dict[str, Any]]:
+    path = store_dir / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported vector store format {manifest.get('format')} in {path}")
+    return manifest
+
+
+def write_manifest(store_dir: Path, manifest: Dict[str, Any]):
+    """Publish ``manifest`` atomically (write temp file, fsync, rename)."""
+    manifest = dict(manifest, format=FORMAT_VERSION)
+    tmp = store_dir / f".{MANIFEST_NAME}.tmp"
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, store_dir / MANIFEST_NAME)
+
+
+def write_segment(store_dir: Path, name: str, vectors: Union[np.ndarray, CSRMatrix],
+                  records: Iterable[Dict[str, Any]], dtype: str = "float32") -> int:
+    """Write one immutable segment and return its row count."""
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported vector dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+    if isinstance(vectors, CSRMatrix):
+        parts = (vectors.indptr, vectors.indices, vectors.data.astype(dtype, copy=False))
+        for part, array in zip(_SPARSE_PARTS, parts):
+            np.save(store_dir / f"{name}.{part}.npy", np.ascontiguousarray(array), allow_pickle=False)
+    else:
+        np.save(store_dir / f"{name}.npy", np.ascontiguousarray(vectors, dtype=dtype), allow_pickle=False)
+    count = 0
+    with (store_dir / f"{name}.jsonl").open("w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def load_segment_vectors(store_dir: Path, name: str, sparse_dim: Optional[int] = None) -> Union[np.ndarray, CSRMatrix]:
+    """Dense vectors, or CSR arrays of width ``sparse_dim`` for sparse stores."""
+    if sparse_dim is not None:
+        indptr, indices, data = (
+            np.load(store_dir / f"{name}.{part}.npy", mmap_mode="r", allow_pickle=False)
+            for part in _SPARSE_PARTS
+        )
+        return CSRMatrix(indptr, indices, data, sparse_dim)
+    return np.load(store_dir / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+
+
+def load_segment(store_dir: Path, name: str, sparse_dim: Optional[int] = None) -> Tuple[Union[np.ndarray, CSRMatrix], List[Dict[str, Any]]]:
+    """Map a segment's vectors read-only and parse its records."""
+    vectors = load_segment_vectors(store_dir, name, sparse_dim)
+    records = []
+    with (store_dir / f"{name}.jsonl").open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return vectors, records
+
+
+def remove_segment(store_dir: Path, name: str):
+    for suffix in (".npy", ".jsonl") + tuple(f".{part}.npy" for part in _SPARSE_PARTS):
+        try:
+            (store_dir / f"{name}{suffix}").unlink()
+        except OSError:
+            # Still mapped by a reader on Windows, or already gone
+            pass
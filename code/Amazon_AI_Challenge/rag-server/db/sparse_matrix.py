@@ -0,0 +1,202 @@
+"""
+Compressed sparse row storage for hashed embeddings
+
+Local hashing vectors have a few dozen non-zeros out of ~1024 dimensions, so
+the store keeps them as three flat arrays (indptr, indices, data) instead of
+a dense matrix. ``dot`` gathers the query value at each stored non-zero and
+sums per row; ``column_dot`` additionally keeps a column-major copy (rows
+grouped by dimension) so a query only touches the postings of its own
+non-zero dimensions. Memory and search cost scale with non-zeros rather
+than rows * dim.
+
+CSRMatrix supports the subset of the ndarray interface the vector store
+uses (``shape``, slicing, row gathers, ``np.asarray``), so code that only
+reads rows works on either layout.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+# Bound on the (queries x non-zeros) temporary built per scoring block
+_SCORE_BLOCK_ELEMENTS = 1 << 24
+
+
+class _GrowBuffer:
+    """Over-allocated arrays shared by successive appends to one matrix."""
+
+    def __init__(self, rows: int, nnz: int, data_dtype):
+        self.indptr = np.zeros(rows + 1, dtype=np.int64)
+        self.indices = np.empty(nnz, dtype=np.int32)
+        self.data = np.empty(nnz, dtype=data_dtype)
+        # Rows written so far; only the matrix ending here may append in place
+        self.rows = 0
+
+
+class _ColumnIndex:
+    """Column-major copy of a matrix's first ``rows`` rows."""
+
+    def __init__(self, matrix: "CSRMatrix"):
+        self.rows = matrix.shape[0]
+        cols = np.asarray(matrix.indices)
+        order = np.argsort(cols, kind="stable")
+        row_of = np.repeat(np.arange(self.rows, dtype=np.int32), np.diff(matrix.indptr))
+        self.row_ids = row_of[order]
+        self.data = np.asarray(matrix.data, dtype=np.float32)[order]
+        self.colptr = np.zeros(matrix.dim + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=matrix.dim), out=self.colptr[1:])
+
+    def scores(self, qvec: np.ndarray) -> np.ndarray:
+        dims = np.flatnonzero(qvec)
+        starts = self.colptr[dims]
+        lengths = self.colptr[dims + 1] - starts
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        weights = self.data[positions] * np.repeat(qvec[dims], lengths)
+        return np.bincount(self.row_ids[positions], weights, minlength=self.rows)
+
+
+class CSRMatrix:
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, dim: int,
+                 _buffer: Optional[_GrowBuffer] = None, _columns: Optional[_ColumnIndex] = None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.dim = int(dim)
+        self._buffer = _buffer
+        # Column index over a prefix of the rows, carried over by append()
+        self._columns = _columns
+
+    @classmethod
+    def empty(cls, dim: int = 0) -> "CSRMatrix":
+        return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                   np.zeros(0, dtype=np.float32), dim)
+
+    @classmethod
+    def from_dense(cls, dense: np.ndarray) -> "CSRMatrix":
+        dense = np.asarray(dense, dtype=np.float32)
+        rows, cols = np.nonzero(dense)
+        indptr = np.zeros(dense.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=dense.shape[0]), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int32), dense[rows, cols], dense.shape[1])
+
+    @classmethod
+    def concat(cls, matrices: List["CSRMatrix"]) -> "CSRMatrix":
+        if not matrices:
+            return cls.empty()
+        offsets = np.cumsum([0] + [m.nnz for m in matrices[:-1]])
+        indptr = np.concatenate([[0]] + [m.indptr[1:] + off for m, off in zip(matrices, offsets)])
+        indices = np.concatenate([m.indices for m in matrices]).astype(np.int32, copy=False)
+        data = np.concatenate([np.asarray(m.data, dtype=np.float32) for m in matrices])
+        return cls(indptr, indices, data, matrices[0].dim)
+
+    @property
+    def shape(self):
+        return (self.indptr.shape[0] - 1, self.dim)
+
+    @property
+    def size(self) -> int:
+        # Same meaning as ndarray.size, so emptiness checks work on both layouts
+        return self.shape[0] * self.dim
+
+    @property
+    def nnz(self) -> int:
+        return int(self.indptr[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key) -> "CSRMatrix":
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.shape[0])
+            if step != 1:
+                raise ValueError("CSRMatrix slices must be contiguous")
+            stop = max(start, stop)
+            lo, hi = int(self.indptr[start]), int(self.indptr[stop])
+            return CSRMatrix(self.indptr[start:stop + 1] - lo, self.indices[lo:hi], self.data[lo:hi], self.dim)
+        rows = np.asarray(key)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        rows = rows.astype(np.int64, copy=False).reshape(-1)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.zeros(rows.size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return CSRMatrix(indptr, self.indices[positions], self.data[positions], self.dim)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        out = np.zeros(self.shape, dtype=np.float32)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        out[rows, self.indices] = self.data
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+    def append(self, other: "CSRMatrix") -> "CSRMatrix":
+        """
+        This matrix followed by ``other``'s rows. Storage grows geometrically
+        and is shared with the result, so rows already visible to readers of
+        ``self`` are never rewritten.
+        """
+        n, nnz = self.shape[0], self.nnz
+        need_rows, need_nnz = n + other.shape[0], nnz + other.nnz
+        buf = self._buffer
+        if (buf is None or buf.rows != n or buf.indptr.shape[0] <= need_rows
+                or buf.indices.shape[0] < need_nnz):
+            buf = _GrowBuffer(max(need_rows, 2 * n, 256), max(need_nnz, 2 * nnz, 4096), np.float32)
+            buf.indptr[:n + 1] = self.indptr
+            buf.indices[:nnz] = self.indices
+            buf.data[:nnz] = self.data
+            buf.rows = n
+        buf.indptr[n + 1:need_rows + 1] = other.indptr[1:] + nnz
+        buf.indices[nnz:need_nnz] = other.indices
+        buf.data[nnz:need_nnz] = other.data
+        buf.rows = need_rows
+        dim = self.dim if n else other.dim
+        return CSRMatrix(buf.indptr[:need_rows + 1], buf.indices[:need_nnz], buf.data[:need_nnz], dim,
+                         buf, self._columns)
+
+    def dot(self, qvecs: np.ndarray) -> np.ndarray:
+        """``qvecs @ self.T`` for dense queries, touching only stored non-zeros."""
+        n = self.shape[0]
+        out = np.zeros((qvecs.shape[0], n), dtype=np.float32)
+        budget = max(1, _SCORE_BLOCK_ELEMENTS // max(1, qvecs.shape[0]))
+        start = 0
+        while start < n:
+            # Rows whose non-zeros fit the budget (always at least one row)
+            stop = int(np.searchsorted(self.indptr, self.indptr[start] + budget, side="right")) - 1
+            stop = min(n, max(stop, start + 1))
+            lo, hi = int(self.indptr[start]), int(self.indptr[stop])
+            if hi == lo:
+                start = stop
+                continue
+            prod = qvecs[:, self.indices[lo:hi]] * self.data[lo:hi]
+            starts = self.indptr[start:stop] - lo
+            # reduceat misreads empty rows, so only sum the non-empty ones
+            nonempty = np.flatnonzero(np.diff(self.indptr[start:stop + 1]))
+            out[:, start + nonempty] = np.add.reduceat(prod, starts[nonempty], axis=1)
+            start = stop
+        return out
+
+    def column_dot(self, qvecs: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        ``dot`` for a long-lived matrix (optionally only ``rows``), via a
+        column index built on first use. Rows appended since the index was
+        built are scored row-wise; the index is rebuilt once they exceed a
+        quarter of the matrix.
+        """
+        n = self.shape[0]
+        if rows is not None and rows.size * 8 < n:
+            # A small candidate set is cheaper to gather than to score in full
+            return self[rows].dot(qvecs)
+        columns = self._columns
+        if columns is None or 4 * (n - columns.rows) > n:
+            columns = self._columns = _ColumnIndex(self)
+        out = np.empty((qvecs.shape[0], n), dtype=np.float32)
+        for i, qvec in enumerate(qvecs):
+            out[i, :columns.rows] = columns.scores(qvec)
+        if columns.rows < n:
+            out[:, columns.rows:] = self[columns.rows:].dot(qvecs)
+        return out if rows is None else out[:, rows]
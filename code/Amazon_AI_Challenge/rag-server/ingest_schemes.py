@@ -5,13 +5,13 @@ Creates comprehensive vector database with real government scheme information
 import requests
 from bs4 import BeautifulSoup
 import json
-from pathlib import Path
 from typing import List, Dict, Any
 import logging
 from datetime import datetime
 import hashlib
 import time
 from db.chromadb_client import chromadb_client
+from rag.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, count_tokens, section_chunks
 from dotenv import load_dotenv
 import os
 
@@ -77,6 +77,22 @@ SCHEME_SOURCES = {
 }
 
 
+# Spoken/common names callers use, stored as chunk metadata for direct lookup
+# (ids, full names and parenthesised acronyms are matched automatically)
+SCHEME_ALIASES = {
+    "PM-KISAN-001": ["PM Kisan", "Kisan Samman Nidhi"],
+    "PMAY-G-002": ["PMAY", "PM Awas Yojana", "Awas Yojana Gramin"],
+    "PMUY-003": ["Ujjwala", "Ujjwala Yojana", "free gas connection"],
+    "NSP-SC-004": ["NSP", "SC ST scholarship"],
+    "NSP-OBC-005": ["OBC scholarship"],
+    "MUDRA-006": ["MUDRA", "Mudra loan"],
+    "PMJAY-007": ["PMJAY", "Ayushman Bharat", "Ayushman card"],
+    "IGNOAPS-008": ["old age pension"],
+    "IGNDPS-009": ["disability pension"],
+    "PMKVY-010": ["Kaushal Vikas Yojana", "skill India"],
+}
+
+
 # Comprehensive Government Scheme Knowledge Base
 SCHEME_KNOWLEDGE_BASE = [
     {
@@ -1059,17 +1075,22 @@ class SchemeDocumentIngester:
     """Ingest government scheme documents into vector database"""
     
     def __init__(self):
-        self.chunk_size = 2000
-        self.chunk_overlap = 400
+        self.chunk_tokens = CHUNK_TOKENS
+        self.chunk_overlap_tokens = CHUNK_OVERLAP_TOKENS
+        # Sections citizens ask about directly always get a chunk of their own
+        self.standalone_sections = ("eligib", "document", "application", "apply", "enrol", "benefit")
     
     def chunk_content(self, content: str, metadata: Dict) -> List[Dict]:
-        """Split content into chunks with metadata"""
+        """Split content into per-section chunks (Eligibility, Documents, ...) with metadata"""
         chunks = []
-        words = content.split()
+        # Every chunk names its scheme, so a section found by search stands on its own
+        prefix = f"{metadata.get('scheme_name', metadata['scheme_id'])} - "
+        budget = self.chunk_tokens - count_tokens(prefix)
         
-        for i in range(0, len(words), self.chunk_size - self.chunk_overlap):
-            chunk_words = words[i:i + self.chunk_size]
-            chunk_text = ' '.join(chunk_words)
+        planned = section_chunks(content, budget, self.chunk_overlap_tokens, standalone=self.standalone_sections)
+        
+        for i, (section, (start, end)) in enumerate(planned):
+            chunk_text = prefix + content[start:end]
             
             if len(chunk_text.strip()) > 100:
                 chunk_id = hashlib.md5(
@@ -1079,7 +1100,7 @@ class SchemeDocumentIngester:
                 chunks.append({
                     'id': chunk_id,
                     'text': chunk_text.strip(),
-                    'metadata': metadata
+                    'metadata': dict(metadata, section=section or 'Overview', chunk_index=i)
                 })
         
         return chunks
@@ -1091,17 +1112,14 @@ class SchemeDocumentIngester:
         logger.info("=" * 70)
         
         try:
-            # Clear existing data first
-            logger.info("🗑️  Clearing existing vector database...")
-            store_dir = Path(__file__).parent / ".vectorstore"
-            if store_dir.exists():
-                import shutil
-                shutil.rmtree(store_dir)
-                store_dir.mkdir(exist_ok=True)
-            
-            # Connect to ChromaDB
+            # Connect to ChromaDB (existing chunks are upserted, not rebuilt)
             chromadb_client.connect()
             
+            if chromadb_client.model_mismatch():
+                # Vectors from another (or an unknown) embedding model can't be reused
+                logger.info("🗑️  Embedding model changed, clearing existing vector database...")
+                chromadb_client.reset()
+            
             total_chunks = 0
             all_documents = []
             all_metadatas = []
@@ -1124,6 +1142,7 @@ class SchemeDocumentIngester:
                     'scheme_name': scheme_name,
                     'category': category,
                     'source': 'government_portal',
+                    'aliases': SCHEME_ALIASES.get(scheme_id, []),
                     'ingestion_date': datetime.now().isoformat()
                 }
                 
@@ -1139,13 +1158,36 @@ class SchemeDocumentIngester:
                 
                 total_chunks += len(chunks)
             
-            # Batch add all documents to ChromaDB
-            logger.info(f"\n💾 Adding {total_chunks} chunks to vector database...")
-            chromadb_client.add_documents(
+            # Unchanged chunks keep their original ingestion date, so a re-run
+            # with no edits writes nothing
+            stored = chromadb_client.get(all_ids)
+            stored_chunks = dict(zip(stored['ids'], zip(stored['documents'], stored['metadatas'])))
+            for chunk_id, text, chunk_metadata in zip(all_ids, all_documents, all_metadatas):
+                previous = stored_chunks.get(chunk_id)
+                if previous is not None and previous[0] == text and 'ingestion_date' in previous[1]:
+                    chunk_metadata['ingestion_date'] = previous[1]['ingestion_date']
+            
+            # Upsert by chunk id: only new or edited chunks are re-embedded
+            logger.info(f"\n💾 Upserting {total_chunks} chunks into vector database...")
+            written = chromadb_client.upsert(
+                ids=all_ids,
                 documents=all_documents,
-                metadatas=all_metadatas,
-                ids=all_ids
+                metadatas=all_metadatas
             )
+            logger.info(f"   {written} chunks written, {total_chunks - written} unchanged")
+            
+            # Drop chunks of schemes (or chunk positions) that no longer exist
+            current_ids = set(all_ids)
+            stale_ids = [
+                chunk_id for chunk_id in chromadb_client.get_ids({'source': 'government_portal'})
+                if chunk_id not in current_ids
+            ]
+            if stale_ids:
+                removed = chromadb_client.delete(stale_ids)
+                logger.info(f"🗑️  Removed {removed} stale chunks")
+            
+            # Merge this run's segments so the server maps a single file
+            chromadb_client.compact()
             
             # Verify insertion
             stats = chromadb_client.get_collection_stats()
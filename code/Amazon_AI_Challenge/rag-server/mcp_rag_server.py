@@ -8,6 +8,8 @@ Features:
 - Category-specific filtering (Agriculture, Education, Health, Housing, etc.)
 - Eligibility criteria matching
 - 1000+ government scheme documents
+- Optional multi-process mode (RAG_SERVER_WORKERS) over one memory-mapped store,
+  with SIGHUP swapping in the newest ingested generation
 """
 
 from fastmcp import FastMCP
@@ -18,16 +20,21 @@ from typing import Optional, List
 import logging
 from dotenv import load_dotenv
 from starlette.responses import JSONResponse
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import functools
+import signal
+import socket
+import sys
+import threading
+import time
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Setup logging: records are formatted and written by a background thread
+from rag.tool_logging import setup_logging, logged_tool
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize FastMCP server
@@ -35,17 +42,69 @@ mcp = FastMCP("scheme-saarthi-rag-server")
 
 # Import RAG components
 from db.chromadb_client import chromadb_client
+from db.chromadb_client import STORE_DIR, EMBED_MODEL_ID
 from rag.retriever import knowledge_retriever
 
 
+# Retrieval runs on a bounded pool so the event loop keeps serving other
+# sessions: NumPy scoring releases the GIL and Google embedding calls block
+RAG_TOOL_WORKERS = int(os.getenv("RAG_TOOL_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+_rag_executor = ThreadPoolExecutor(max_workers=RAG_TOOL_WORKERS, thread_name_prefix="rag-tool")
+
+
+async def _run_rag(fn, *args):
+    """Run a blocking retriever/store call on the RAG pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_rag_executor, functools.partial(fn, *args))
+
+
 # ========== Initialization Helper ==========
+def _check_embed_model(client):
+    """Queries against vectors of another embedding model return noise; say so loudly"""
+    if client.model_mismatch():
+        logger.error(
+            f"❌ Knowledge base was embedded with '{client.embed_model or 'unknown'}' but this server "
+            f"embeds queries with '{EMBED_MODEL_ID}'; search results will be meaningless until "
+            f"the knowledge base is re-ingested (python ingest_schemes.py, python -m rag.ingest_pdfs)"
+        )
+
+
 def _init_kb():
     logger.info("🚀 Initializing Scheme Saarthi RAG MCP Server...")
     chromadb_client.connect()
+    _check_embed_model(chromadb_client)
     stats = chromadb_client.get_collection_stats()
     logger.info(f"📚 Scheme knowledge base ready: {stats.get('count', 0)} documents")
 
 
+_reload_lock = threading.Lock()
+
+
+def _reload_kb():
+    """Swap in the newest on-disk generation, if an ingest published one"""
+    global chromadb_client
+    with _reload_lock:
+        try:
+            fresh = chromadb_client.reloaded()
+        except Exception as e:
+            logger.error(f"❌ Knowledge base reload failed: {e}", exc_info=True)
+            return
+        if fresh is chromadb_client:
+            logger.info("🔄 Reload requested, knowledge base already current")
+            return
+        _check_embed_model(fresh)
+        # Single reference swaps: in-flight calls finish on the old client
+        chromadb_client = fresh
+        knowledge_retriever.client = fresh
+        logger.info(f"🔄 Reloaded knowledge base: {fresh.get_collection_stats().get('count', 0)} documents")
+
+
+def _install_reload_handler():
+    if hasattr(signal, "SIGHUP"):
+        # Reload off the signal handler; connect() maps files and parses records
+        signal.signal(signal.SIGHUP, lambda *_: threading.Thread(target=_reload_kb, name="rag-reload").start())
+
+
 # ========== Custom Routes ==========
 
 @mcp.custom_route("/health", methods=["GET"])
@@ -57,12 +116,14 @@ async def health_check(request):
         "server": "scheme-saarthi-rag-server",
         "timestamp": datetime.now().isoformat(),
         "documents_count": stats.get('count', 0),
+        "response_cache": knowledge_retriever.cache_stats(),
         "tools_available": [
             "search_scheme_knowledge",
             "search_scheme_by_category",
             "check_eligibility",
             "search_schemes_by_benefit",
-            "get_scheme_knowledge"
+            "get_scheme_knowledge",
+            "search_scheme_knowledge_batch"
         ]
     })
 
@@ -80,7 +141,8 @@ async def root(request):
 # ========== RAG MCP Tools ==========
 
 @mcp.tool()
-def search_scheme_knowledge(query: str, n_results: int = 5) -> str:
+@logged_tool("Error searching schemes")
+async def search_scheme_knowledge(query: str, n_results: int = 5) -> str:
     """
     Search the government schemes knowledge base using natural language query.
     Use this for detailed scheme information from documents and policies.
@@ -99,40 +161,12 @@ def search_scheme_knowledge(query: str, n_results: int = 5) -> str:
         search_scheme_knowledge(query="scholarships for SC/ST students")
         search_scheme_knowledge(query="pension schemes for senior citizens")
     """
-    try:
-        logger.info("="*60)
-        logger.info("🔍 SCHEME SEARCH")
-        logger.info(f"   Query: '{query}'")
-        logger.info(f"   Max Results: {n_results}")
-        logger.info("="*60)
-        
-        result = knowledge_retriever.search_symptom(query)
-        
-        result_length = len(result)
-        
-        logger.info("="*60)
-        logger.info(f"✅ SCHEME SEARCH COMPLETE")
-        logger.info(f"   Total characters returned: {result_length}")
-        logger.info("")
-        logger.info("📋 FULL RAG OUTPUT:")
-        logger.info("-"*60)
-        logger.info(result)
-        logger.info("-"*60)
-        logger.info("="*60)
-        
-        return result
-        
-    except Exception as e:
-        logger.error("="*60)
-        logger.error(f"❌ SCHEME SEARCH FAILED")
-        logger.error(f"   Query: '{query}'")
-        logger.error(f"   Error: {e}", exc_info=True)
-        logger.error("="*60)
-        return f"Error searching schemes: {str(e)}"
+    return await _run_rag(knowledge_retriever.search_symptom, query)
 
 
 @mcp.tool()
-def search_scheme_by_category(category: str, citizen_profile: str = "") -> str:
+@logged_tool("Error searching category")
+async def search_scheme_by_category(category: str, citizen_profile: str = "") -> str:
     """
     Search for schemes in a specific category with optional citizen profile for filtering.
     
@@ -151,46 +185,15 @@ def search_scheme_by_category(category: str, citizen_profile: str = "") -> str:
         search_scheme_by_category(category="Education", citizen_profile="SC student, 10th pass")
         search_scheme_by_category(category="Health", citizen_profile="senior citizen, low income")
     """
-    try:
-        query = f"{category} schemes"
-        if citizen_profile:
-            query += f" for {citizen_profile}"
-            
-        logger.info("="*60)
-        logger.info("📂 CATEGORY SEARCH")
-        logger.info(f"   Category: {category}")
-        logger.info(f"   Profile: {citizen_profile if citizen_profile else 'None'}")
-        logger.info(f"   Full Query: '{query}'")
-        logger.info("="*60)
-        
-        result = knowledge_retriever.search_symptom(query)
-        
-        result_length = len(result)
-        
-        logger.info("="*60)
-        logger.info(f"✅ CATEGORY SEARCH COMPLETE")
-        logger.info(f"   Category: {category}")
-        logger.info(f"   Response length: {result_length} characters")
-        logger.info("")
-        logger.info("📋 FULL RAG OUTPUT:")
-        logger.info("-"*60)
-        logger.info(result)
-        logger.info("-"*60)
-        logger.info("="*60)
-        
-        return result
-        
-    except Exception as e:
-        logger.error("="*60)
-        logger.error(f"❌ CATEGORY SEARCH FAILED")
-        logger.error(f"   Category: {category}")
-        logger.error(f"   Error: {e}", exc_info=True)
-        logger.error("="*60)
-        return f"Error searching category: {str(e)}"
+    query = f"{category} schemes"
+    if citizen_profile:
+        query += f" for {citizen_profile}"
+    return await _run_rag(knowledge_retriever.search_symptom, query)
 
 
 @mcp.tool()
-def check_eligibility(scheme_name: str, citizen_profile: str) -> str:
+@logged_tool("Error checking eligibility")
+async def check_eligibility(scheme_name: str, citizen_profile: str) -> str:
     """
     Check if a citizen is eligible for a specific scheme based on their profile.
     
@@ -207,43 +210,13 @@ def check_eligibility(scheme_name: str, citizen_profile: str) -> str:
             citizen_profile="age 45, farmer, 2 acres land, income 1 lakh per year"
         )
     """
-    try:
-        query = f"{scheme_name} eligibility criteria for {citizen_profile}"
-        
-        logger.info("="*60)
-        logger.info("✔️  ELIGIBILITY CHECK")
-        logger.info(f"   Scheme: {scheme_name}")
-        logger.info(f"   Profile: {citizen_profile}")
-        logger.info("="*60)
-        
-        result = knowledge_retriever.search_symptom(query)
-        
-        result_length = len(result)
-        
-        logger.info("="*60)
-        logger.info(f"✅ ELIGIBILITY CHECK COMPLETE")
-        logger.info(f"   Scheme: {scheme_name}")
-        logger.info(f"   Response length: {result_length} characters")
-        logger.info("")
-        logger.info("📋 FULL RAG OUTPUT:")
-        logger.info("-"*60)
-        logger.info(result)
-        logger.info("-"*60)
-        logger.info("="*60)
-        
-        return result
-        
-    except Exception as e:
-        logger.error("="*60)
-        logger.error(f"❌ ELIGIBILITY CHECK FAILED")
-        logger.error(f"   Scheme: {scheme_name}")
-        logger.error(f"   Error: {e}", exc_info=True)
-        logger.error("="*60)
-        return f"Error checking eligibility: {str(e)}"
+    query = f"{scheme_name} eligibility criteria for {citizen_profile}"
+    return await _run_rag(knowledge_retriever.search_symptom, query)
 
 
 @mcp.tool()
-def search_schemes_by_benefit(benefit_type: str, min_amount: int = 0) -> str:
+@logged_tool("Error searching benefits")
+async def search_schemes_by_benefit(benefit_type: str, min_amount: int = 0) -> str:
     """
     Search for schemes offering specific types of benefits above a certain amount.
     
@@ -261,38 +234,15 @@ def search_schemes_by_benefit(benefit_type: str, min_amount: int = 0) -> str:
         search_schemes_by_benefit(benefit_type="Loan", min_amount=50000)
         search_schemes_by_benefit(benefit_type="Subsidy")
     """
-    try:
-        query = f"schemes providing {benefit_type}"
-        if min_amount > 0:
-            query += f" minimum {min_amount} rupees"
-            
-        logger.info("="*60)
-        logger.info("💰 BENEFIT SEARCH")
-        logger.info(f"   Benefit Type: {benefit_type}")
-        logger.info(f"   Min Amount: ₹{min_amount}")
-        logger.info("="*60)
-        
-        result = knowledge_retriever.search_symptom(query)
-        
-        result_length = len(result)
-        
-        logger.info("="*60)
-        logger.info(f"✅ BENEFIT SEARCH COMPLETE")
-        logger.info(f"   Response length: {result_length} characters")
-        logger.info("="*60)
-        
-        return result
-        
-    except Exception as e:
-        logger.error("="*60)
-        logger.error(f"❌ BENEFIT SEARCH FAILED")
-        logger.error(f"   Error: {e}", exc_info=True)
-        logger.error("="*60)
-        return f"Error searching benefits: {str(e)}"
+    query = f"schemes providing {benefit_type}"
+    if min_amount > 0:
+        query += f" minimum {min_amount} rupees"
+    return await _run_rag(knowledge_retriever.search_symptom, query)
 
 
 @mcp.tool()
-def get_scheme_knowledge(scheme_id_or_name: str) -> str:
+@logged_tool("Error getting scheme details")
+async def get_scheme_knowledge(scheme_id_or_name: str) -> str:
     """
     Get detailed knowledge base information about a specific government scheme.
     Uses RAG (Retrieval Augmented Generation) to fetch comprehensive scheme details.
@@ -307,42 +257,42 @@ def get_scheme_knowledge(scheme_id_or_name: str) -> str:
         get_scheme_knowledge(scheme_id_or_name="PM-KISAN")
         get_scheme_knowledge(scheme_id_or_name="Pradhan Mantri Awas Yojana")
     """
+    # Direct id/name/alias lookup; semantic search only if nothing matches
+    return await _run_rag(knowledge_retriever.get_scheme_details, scheme_id_or_name)
+
+
+@mcp.tool()
+@logged_tool("Error in batch search")
+async def search_scheme_knowledge_batch(queries: List[str]) -> str:
+    """
+    Run several knowledge base searches in one call. Use this instead of
+    back-to-back search_scheme_knowledge / check_eligibility / get_scheme_knowledge
+    calls for the same citizen turn: all queries are embedded together and
+    scored in one pass.
+    
+    Args:
+        queries: Natural language queries (e.g., ["PM-KISAN eligibility for farmer with 2 acres",
+                 "PM-KISAN documents required", "pension schemes for senior citizens"])
+    
+    Returns:
+        JSON list with one {"query", "result"} entry per query, in the same order
+    
+    Example:
+        search_scheme_knowledge_batch(queries=["schemes for farmers", "Ayushman Bharat eligibility"])
+    """
     try:
-        query = f"{scheme_id_or_name} complete details benefits eligibility documents application process"
-        
-        logger.info("="*60)
-        logger.info("📄 SCHEME DETAILS")
-        logger.info(f"   Scheme: {scheme_id_or_name}")
-        logger.info("="*60)
-        
-        result = knowledge_retriever.search_symptom(query)
-        
-        result_length = len(result)
-        
-        logger.info("="*60)
-        logger.info(f"✅ DETAILS RETRIEVED")
-        logger.info(f"   Scheme: {scheme_id_or_name}")
-        logger.info(f"   Response length: {result_length} characters")
-        logger.info("")
-        logger.info("📋 FULL RAG OUTPUT:")
-        logger.info("-"*60)
-        logger.info(result)
-        logger.info("-"*60)
-        logger.info("="*60)
-        
-        return result
-        
+        results = await _run_rag(knowledge_retriever.search_symptoms, queries)
     except Exception as e:
-        logger.error("="*60)
-        logger.error(f"❌ DETAILS RETRIEVAL FAILED")
-        logger.error(f"   Scheme: {scheme_id_or_name}")
-        logger.error(f"   Error: {e}", exc_info=True)
-        logger.error("="*60)
-        return f"Error getting scheme details: {str(e)}"
+        logger.error(f"❌ Batch scheme search failed: {e}", exc_info=True)
+        return json.dumps({"error": str(e)})
+    return json.dumps(
+        [{"query": query, "result": result} for query, result in zip(queries, results)],
+        ensure_ascii=False, indent=2
+    )
 
 
 @mcp.tool()
-def get_knowledge_base_stats() -> str:
+async def get_knowledge_base_stats() -> str:
     """
     Get statistics about the scheme knowledge base (document count, collection info).
     Useful for debugging or verifying knowledge base is loaded.
@@ -351,7 +301,7 @@ def get_knowledge_base_stats() -> str:
         JSON string with knowledge base statistics
     """
     try:
-        stats = chromadb_client.get_collection_stats()
+        stats = await _run_rag(chromadb_client.get_collection_stats)
         logger.info(f"📊 Scheme knowledge base stats requested")
         return json.dumps(stats, indent=2)
         
@@ -362,16 +312,116 @@ def get_knowledge_base_stats() -> str:
 
 # ========== Server Entry Point ==========
 
+PID_FILE = STORE_DIR / "rag_server.pid"
+
+
+def _listen_socket(host: str, port: int) -> socket.socket:
+    """A listening socket that every worker binds on its own (SO_REUSEPORT)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve_worker(host: str, port: int, transport: str):
+    """One worker process: map the store, then serve on a shared port"""
+    import uvicorn
+    
+    _init_kb()
+    _install_reload_handler()
+    app = mcp.http_app(transport=transport, stateless_http=True if transport != "sse" else None)
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info", lifespan="on"))
+    server.run(sockets=[_listen_socket(host, port)])
+
+
+def _run_workers(n_workers: int, host: str, port: int, transport: str):
+    """
+    Pre-fork supervisor: starts ``n_workers`` processes that each bind the
+    port with SO_REUSEPORT, so the kernel spreads connections across them.
+    Crashed workers are restarted; SIGHUP is forwarded so every worker
+    reloads the store, and SIGINT/SIGTERM stop them all.
+    """
+    children = {}
+    stopping = False
+    
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+                signal.signal(sig, signal.SIG_DFL)
+            try:
+                _serve_worker(host, port, transport)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        logger.info(f"👷 Started RAG worker {slot} (pid {pid})")
+    
+    def forward(sig, _frame):
+        nonlocal stopping
+        if sig != signal.SIGHUP:
+            stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+    
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+        signal.signal(sig, forward)
+    PID_FILE.write_text(str(os.getpid()))
+    try:
+        for slot in range(n_workers):
+            spawn(slot)
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = children.pop(pid, None)
+            if slot is not None and not stopping:
+                logger.warning(f"⚠️ RAG worker {slot} (pid {pid}) exited with status {status}, restarting")
+                time.sleep(1)
+                spawn(slot)
+    finally:
+        PID_FILE.unlink(missing_ok=True)
+
+
 if __name__ == "__main__":
     logger.info("🚀 Starting Scheme Saarthi RAG MCP Server...")
-    _init_kb()
     
     # Get port from environment or default to 8002 (different from main MCP server)
     port = int(os.getenv("RAG_SERVER_PORT", "8002"))
     host = "0.0.0.0"
+    workers = max(1, int(os.getenv("RAG_SERVER_WORKERS", "1")))
+    transport = (os.getenv("RAG_SERVER_TRANSPORT", "sse") or "sse").lower()
+    
+    if workers > 1 and (sys.platform == "win32" or not hasattr(socket, "SO_REUSEPORT")):
+        logger.warning("⚠️ RAG_SERVER_WORKERS needs fork and SO_REUSEPORT; running a single process")
+        workers = 1
+    if workers > 1 and transport == "sse":
+        # An SSE session lives in one process, but its POSTs may reach any worker
+        logger.warning("⚠️ SSE sessions cannot span worker processes; serving stateless HTTP on /mcp instead")
+        transport = "http"
     
-    logger.info(f"🌐 Starting SSE server on {host}:{port}")
     logger.info(f"📚 This server handles all government scheme knowledge base queries")
     
-    # Run with SSE transport
-    mcp.run(transport="sse", host=host, port=port)
+    if workers > 1:
+        logger.info(f"🌐 Starting {workers} {transport.upper()} workers on {host}:{port}")
+        _run_workers(workers, host, port, transport)
+    else:
+        _init_kb()
+        _install_reload_handler()
+        PID_FILE.write_text(str(os.getpid()))
+        logger.info(f"🌐 Starting {transport.upper()} server on {host}:{port}")
+        try:
+            if transport == "sse":
+                mcp.run(transport="sse", host=host, port=port)
+            else:
+                mcp.run(transport=transport, host=host, port=port, stateless_http=True)
+        finally:
+            PID_FILE.unlink(missing_ok=True)
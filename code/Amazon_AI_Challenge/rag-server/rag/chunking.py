@@ -0,0 +1,154 @@
+"""
+Shared chunking engine for the ingesters
+
+Chunks are planned as ``(start, end)`` character spans into the original
+string: boundaries are searched in place (bounded str.rfind, compiled regex
+matches from an offset) rather than in sliced copies of each window, so
+planning is linear in the text length and allocates one span per chunk.
+Callers slice only the chunks they keep.
+
+Chunk budgets are in tokens, as the embedding model and Gemini count them:
+
+    token_offsets()   offline token estimate with character offsets
+    token_spans()     token budget with overlap, snapped back to the last
+                      sentence end or paragraph break in the window
+                      (PDFIngester)
+    section_chunks()  one chunk per "Heading:" section, small sections
+                      packed together and large ones split by token_spans()
+                      (SchemeDocumentIngester)
+
+    RAG_CHUNK_TOKENS=384          token budget per chunk
+    RAG_CHUNK_OVERLAP_TOKENS=64   tokens repeated from the previous chunk
+"""
+import bisect
+import os
+import re
+from typing import Iterator, List, Optional, Tuple
+
+CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "384"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "64"))
+
+# Token estimate for large SentencePiece vocabularies (Gemini, text-embedding-004):
+# a letter run is one token per _WORD_PIECE letters (most English words stay
+# whole), each digit is its own token, as is every other symbol; whitespace is
+# free. Stored with the ingest settings, so changing it re-chunks everything.
+TOKENIZER_ID = "estimate-v1"
+_TOKEN_RE = re.compile(r'[^\W\d_]+|\S')
+_WORD_PIECE = 8
+
+# "Eligibility Criteria:" style lines: capitalised, short, ending with a colon
+_HEADING_RE = re.compile(r'^[A-Z][^\n:]{0,60}:[ \t]*$', re.MULTILINE)
+
+Span = Tuple[int, int]
+
+
+def strip_span(text: str, start: int, end: int) -> Span:
+    """``(start, end)`` narrowed to exclude surrounding whitespace, like str.strip()."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def token_offsets(text: str, pos: int = 0, endpos: Optional[int] = None) -> Tuple[List[int], List[int]]:
+    """Start and end offsets of the estimated tokens of ``text[pos:endpos]``."""
+    starts, ends = [], []
+    for m in _TOKEN_RE.finditer(text, pos, len(text) if endpos is None else endpos):
+        start, end = m.span()
+        if end - start <= _WORD_PIECE:
+            starts.append(start)
+            ends.append(end)
+            continue
+        for piece in range(start, end, _WORD_PIECE):
+            starts.append(piece)
+            ends.append(min(piece + _WORD_PIECE, end))
+    return starts, ends
+
+
+def count_tokens(text: str, pos: int = 0, endpos: Optional[int] = None) -> int:
+    """Estimated token count of ``text[pos:endpos]``."""
+    return len(token_offsets(text, pos, endpos)[0])
+
+
+def token_spans(text: str, max_tokens: int, overlap_tokens: int, pos: int = 0, endpos: Optional[int] = None,
+                min_break: float = 0.6, min_chars: int = 0) -> Iterator[Span]:
+    """
+    Stripped spans of at most ``max_tokens`` tokens covering ``text[pos:endpos]``,
+    each starting ``overlap_tokens`` tokens before the previous one ended. A
+    window cut inside the text ends after its last ". " or "\\n\\n" instead,
+    when that lies past ``min_break`` of the window. Spans of ``min_chars``
+    or fewer characters are skipped.
+    """
+    starts, ends = token_offsets(text, pos, endpos)
+    count = len(starts)
+    first = 0
+    while first < count:
+        last = min(first + max_tokens, count)
+        start, end = starts[first], ends[last - 1]
+        if last < count:
+            # The window runs up to the next token, so a trailing ". " is inside it
+            window_end = starts[last]
+            break_point = max(text.rfind('. ', start, window_end), text.rfind('\n\n', start, window_end))
+            if break_point - start > (window_end - start) * min_break:
+                end = break_point + 1
+                last = bisect.bisect_left(starts, end, first + 1, last)
+        span_start, span_end = strip_span(text, start, end)
+        if span_end - span_start > min_chars:
+            yield span_start, span_end
+        if last == count:
+            return
+        first = max(last - overlap_tokens, first + 1)
+
+
+def sections(text: str) -> List[Tuple[str, int, int]]:
+    """
+    ``(heading, start, end)`` of the text before the first heading line
+    (heading "") and of each heading line with the text up to the next one.
+    """
+    found = []
+    start, heading = 0, ""
+    for m in _HEADING_RE.finditer(text):
+        found.append((heading, start, m.start()))
+        start, heading = m.start(), m.group().strip().rstrip(":")
+    found.append((heading, start, len(text)))
+    return [(heading, s, e) for heading, s, e in found if text[s:e].strip()]
+
+
+def section_chunks(text: str, max_tokens: int, overlap_tokens: int, min_tokens: int = 48,
+                   standalone: Tuple[str, ...] = ()) -> List[Tuple[str, Span]]:
+    """
+    ``(heading, span)`` chunks following the sections of ``text``. A heading
+    with no body of its own is joined to the next section; a section under
+    ``min_tokens`` is packed into the chunk before it while that stays within
+    ``max_tokens``, unless its heading contains one of the ``standalone``
+    words (case-insensitive); a section over ``max_tokens`` is split by
+    token_spans().
+    """
+    planned: List[Tuple[str, int, int, int]] = []  # heading, start, end, tokens
+    pending: Optional[Tuple[str, int]] = None  # bodiless heading waiting for the next section
+    for heading, start, end in sections(text):
+        if pending is not None:
+            heading, start = pending
+            pending = None
+        line_end = text.find("\n", start, end)
+        if heading and (line_end == -1 or not text[line_end:end].strip()):
+            pending = (heading, start)
+            continue
+        tokens = count_tokens(text, start, end)
+        packable = not any(word in heading.lower() for word in standalone)
+        if planned and packable and tokens < min_tokens and planned[-1][3] + tokens <= max_tokens:
+            prev_heading, prev_start, _, prev_tokens = planned[-1]
+            planned[-1] = (prev_heading, prev_start, end, prev_tokens + tokens)
+        else:
+            planned.append((heading, start, end, tokens))
+    if pending is not None:
+        planned.append((pending[0], pending[1], len(text), count_tokens(text, pending[1])))
+
+    chunks = []
+    for heading, start, end, tokens in planned:
+        if tokens <= max_tokens:
+            chunks.append((heading, strip_span(text, start, end)))
+        else:
+            chunks.extend((heading, span) for span in token_spans(text, max_tokens, overlap_tokens, start, end))
+    return chunks
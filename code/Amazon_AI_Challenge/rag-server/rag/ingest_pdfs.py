@@ -1,23 +1,212 @@
 """
 PDF Ingestion Pipeline for RAG Knowledge Base
 Processes service manuals and SOPs into ChromaDB
+
+Ingestion is a streaming pipeline with bounded buffers between stages:
+
+    extract   page ranges of each PDF are read by a process pool, a bounded
+              window of ranges ahead of the chunker (RAG_INGEST_WORKERS,
+              RAG_INGEST_PAGES_PER_TASK)
+    chunk     pages are chunked in file/page order as they arrive
+    store     chunks are embedded and upserted in fixed-size batches by a
+              writer thread behind a bounded queue (RAG_INGEST_BATCH_SIZE,
+              RAG_INGEST_QUEUE_BATCHES)
+
+Memory stays bounded by those windows instead of the corpus size, and a PDF
+that fails to parse is logged and skipped.
+
+Re-runs are incremental: .vectorstore/pdf_manifest.json records each file's
+size, mtime, content hash and chunk ids as soon as all its chunks are stored.
+Unchanged files are skipped (an interrupted run resumes the same way), a
+changed file is re-chunked and upserted, which only embeds chunks whose text
+changed, and chunks it no longer produces or of removed files are deleted.
+A store embedded with another model is reset first, as upsert would keep
+the old model's vectors for chunks whose text did not change.
 """
 from pypdf import PdfReader
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import json
 import logging
-from db.chromadb_client import chromadb_client
+import os
+import queue
+import re
+import threading
+import time
+from db.chromadb_client import chromadb_client, STORE_DIR, EMBED_MODEL_ID
+from rag.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, TOKENIZER_ID, token_spans
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+INGEST_PAGES_PER_TASK = int(os.getenv("RAG_INGEST_PAGES_PER_TASK", "8"))
+INGEST_BATCH_SIZE = int(os.getenv("RAG_INGEST_BATCH_SIZE", "256"))
+INGEST_QUEUE_BATCHES = int(os.getenv("RAG_INGEST_QUEUE_BATCHES", "4"))
+MANIFEST_FILE = STORE_DIR / "pdf_manifest.json"
+# Minimum seconds between manifest rewrites while a run is in progress
+_MANIFEST_SAVE_SECONDS = 5.0
+
+# Remove common footer/header junk
+_JUNK_PHRASES = [
+    "Downloaded from www.Manualslib.com manuals search engine",
+    "Downloaded from",
+    "www.Manualslib.com",
+    "manuals search engine"
+]
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n')
+_SPACES_RE = re.compile(r' +')
+
+
+def clean_text(text: str) -> str:
+    """Clean extracted text from common junk"""
+    for phrase in _JUNK_PHRASES:
+        text = text.replace(phrase, "")
+    
+    # Remove excessive whitespace
+    text = _BLANK_LINES_RE.sub('\n\n', text)  # Max 2 newlines
+    text = _SPACES_RE.sub(' ', text)  # Multiple spaces to single space
+    
+    return text.strip()
+
+
+# Per process: the PDF most recently opened, reused by its next page range
+_reader_cache: Dict[str, PdfReader] = {}
+
+
+def _pdf_reader(pdf_path: str) -> PdfReader:
+    reader = _reader_cache.get(pdf_path)
+    if reader is None:
+        _reader_cache.clear()
+        reader = _reader_cache[pdf_path] = PdfReader(pdf_path)
+    return reader
+
+
+def _extract_pages(pdf_path: str, first: int, last: int) -> Tuple[List[Tuple[int, str]], float]:
+    """
+    Runs in a pool worker: cleaned ``(page_num, text)`` of pages ``first..last``
+    (1-based, inclusive) with meaningful content, and the seconds it took.
+    """
+    started = time.perf_counter()
+    reader = _pdf_reader(pdf_path)
+    pages = []
+    for page_num in range(first, last + 1):
+        text = clean_text(reader.pages[page_num - 1].extract_text())
+        if len(text) > 50:  # Only add pages with meaningful content
+            pages.append((page_num, text))
+    return pages, time.perf_counter() - started
+
+
+class _StageStats:
+    """Items and busy seconds per pipeline stage (each stage has one updating thread)."""
+    
+    STAGES = (("extract", "pages"), ("chunk", "chunks"), ("store", "chunks"))
+    
+    def __init__(self):
+        self.items = Counter()
+        self.seconds = Counter()
+        self.started = time.perf_counter()
+    
+    def add(self, stage: str, items: int, seconds: float):
+        self.items[stage] += items
+        self.seconds[stage] += seconds
+    
+    def report(self):
+        wall = time.perf_counter() - self.started
+        logger.info(f"📊 Pipeline throughput ({wall:.1f}s wall, extract time summed over workers):")
+        for stage, unit in self.STAGES:
+            items, seconds = self.items[stage], self.seconds[stage]
+            rate = items / seconds if seconds else 0.0
+            logger.info(f"   {stage:<8} {items:>7} {unit} in {seconds:7.1f}s  ({rate:,.1f} {unit}/s)")
+        if wall:
+            logger.info(f"   overall  {self.items['store'] / wall:,.1f} chunks/s")
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _IngestManifest:
+    """
+    Resolved PDF path -> {size, mtime_ns, sha256, chunk_ids} of every
+    ingested file. A different embedding model or chunking setting makes
+    every file count as changed; the recorded chunk ids are still used to
+    delete chunks that are no longer produced.
+    """
+    
+    def __init__(self, path: Path, settings: Dict[str, Any]):
+        self.path = path
+        self.settings = settings
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.current = True
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if path.exists():
+            try:
+                saved = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable ingest manifest {path}: {e}")
+                return
+            self.files = saved.get("files", {})
+            self.current = saved.get("settings") == settings
+    
+    def changed(self, pdf_path: Path) -> Optional[Dict[str, Any]]:
+        """None if ``pdf_path`` is unchanged since it was recorded, else its new fingerprint"""
+        entry = self.files.get(str(pdf_path.resolve())) if self.current else None
+        stat = pdf_path.stat()
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return None
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": _file_sha256(pdf_path)}
+        if entry and entry["size"] == stat.st_size and entry["sha256"] == fingerprint["sha256"]:
+            # Touched or copied but identical: only remember the new mtime
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._dirty = True
+            return None
+        return fingerprint
+    
+    def invalidate(self):
+        """Treat every file as changed, e.g. after the vector store was reset"""
+        self.current = False
+    
+    def chunk_ids(self, key: str) -> List[str]:
+        entry = self.files.get(key)
+        return entry["chunk_ids"] if entry else []
+    
+    def record(self, pdf_path: Path, fingerprint: Dict[str, Any], chunk_ids: List[str]):
+        self.files[str(pdf_path.resolve())] = dict(fingerprint, chunk_ids=chunk_ids)
+        self._dirty = True
+    
+    def forget(self, key: str):
+        if self.files.pop(key, None) is not None:
+            self._dirty = True
+    
+    def save(self, force: bool = False):
+        """Write the manifest atomically (throttled unless ``force``)"""
+        if not self._dirty or (not force and time.monotonic() - self._saved_at < _MANIFEST_SAVE_SECONDS):
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"settings": self.settings, "files": self.files}), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
 
 class PDFIngester:
     """Ingest PDF documents into the vector database"""
     
-    def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 300):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE):
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
     
     def extract_text_from_pdf(self, pdf_path: Path) -> List[Dict[str, Any]]:
         """
@@ -25,82 +214,57 @@ class PDFIngester:
         Returns list of {page_num, text, metadata}
         """
         try:
-            reader = PdfReader(str(pdf_path))
-            pages_data = []
-            
-            for page_num, page in enumerate(reader.pages, start=1):
-                text = page.extract_text()
-                
-                # Clean the text - remove common junk
-                text = self._clean_text(text)
-                
-                if text.strip() and len(text.strip()) > 50:  # Only add pages with meaningful content
-                    pages_data.append({
-                        "page_num": page_num,
-                        "text": text,
-                        "source": pdf_path.name
-                    })
+            page_count = len(_pdf_reader(str(pdf_path)).pages)
+            pages, _ = _extract_pages(str(pdf_path), 1, page_count)
+            pages_data = [
+                {"page_num": page_num, "text": text, "source": pdf_path.name}
+                for page_num, text in pages
+            ]
             
             logger.info(f"✅ Extracted {len(pages_data)} pages from {pdf_path.name}")
             return pages_data
-            
+        
         except Exception as e:
             logger.error(f"❌ Failed to extract from {pdf_path}: {e}")
             return []
     
     def _clean_text(self, text: str) -> str:
         """Clean extracted text from common junk"""
-        # Remove common footer/header junk
-        junk_phrases = [
-            "Downloaded from www.Manualslib.com manuals search engine",
-            "Downloaded from",
-            "www.Manualslib.com",
-            "manuals search engine"
-        ]
-        
-        for phrase in junk_phrases:
-            text = text.replace(phrase, "")
-        
-        # Remove excessive whitespace
-        import re
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)  # Max 2 newlines
-        text = re.sub(r' +', ' ', text)  # Multiple spaces to single space
-        
-        return text.strip()
+        return clean_text(text)
     
     def chunk_text(self, text: str) -> List[str]:
         """
         Split text into overlapping chunks with smart boundaries
         """
-        chunks = []
-        start = 0
-        text_length = len(text)
-        
-        while start < text_length:
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            
-            # Try to break at sentence boundary for better context
-            if end < text_length:
-                # Look for sentence endings
-                last_period = chunk.rfind('. ')
-                last_newline = chunk.rfind('\n\n')
-                break_point = max(last_period, last_newline)
-                
-                # Only break if we're past 60% of chunk size
-                if break_point > self.chunk_size * 0.6:
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
-            
-            chunk = chunk.strip()
-            
-            # Only add chunks with meaningful content (not just whitespace/junk)
-            if len(chunk) > 100:  # Minimum 100 chars for meaningful content
-                chunks.append(chunk)
+        # Token-budgeted windows, broken at the last sentence end / paragraph
+        # break past 60% of each; chunks of 100 chars or less are junk and dropped
+        return [
+            text[start:end]
+            for start, end in token_spans(text, self.chunk_tokens, self.chunk_overlap_tokens, min_chars=100)
+        ]
+    
+    def _page_chunks(self, pdf_path: Path, page_num: int, text: str, doc_type: str) -> List[Dict[str, Any]]:
+        """Chunk one page into {text, metadata, id} records"""
+        page_chunks = []
+        # Same-named PDFs in different directories must not share chunk ids
+        pdf_key = str(pdf_path.resolve())
+        for chunk_idx, chunk in enumerate(self.chunk_text(text)):
+            # Generate unique ID
+            chunk_id = hashlib.md5(
+                f"{pdf_key}-{page_num}-{chunk_idx}".encode()
+            ).hexdigest()
             
-            start = end - self.chunk_overlap
-        
-        return chunks
+            page_chunks.append({
+                "text": chunk,
+                "metadata": {
+                    "source": pdf_path.name,
+                    "page": page_num,
+                    "chunk_index": chunk_idx,
+                    "document_type": doc_type
+                },
+                "id": chunk_id
+            })
+        return page_chunks
     
     def process_pdf(self, pdf_path: Path) -> List[Dict[str, Any]]:
         """
@@ -108,27 +272,11 @@ class PDFIngester:
         Returns list of {text, metadata, id}
         """
         pages_data = self.extract_text_from_pdf(pdf_path)
+        doc_type = self._infer_doc_type(pdf_path.name)
         
         all_chunks = []
         for page_data in pages_data:
-            chunks = self.chunk_text(page_data["text"])
-            
-            for chunk_idx, chunk in enumerate(chunks):
-                # Generate unique ID
-                chunk_id = hashlib.md5(
-                    f"{pdf_path.name}-{page_data['page_num']}-{chunk_idx}".encode()
-                ).hexdigest()
-                
-                all_chunks.append({
-                    "text": chunk,
-                    "metadata": {
-                        "source": pdf_path.name,
-                        "page": page_data["page_num"],
-                        "chunk_index": chunk_idx,
-                        "document_type": self._infer_doc_type(pdf_path.name)
-                    },
-                    "id": chunk_id
-                })
+            all_chunks.extend(self._page_chunks(pdf_path, page_data["page_num"], page_data["text"], doc_type))
         
         logger.info(f"📄 Created {len(all_chunks)} chunks from {pdf_path.name}")
         return all_chunks
@@ -146,39 +294,204 @@ class PDFIngester:
         else:
             return "manual"
     
-    def ingest_directory(self, directory: Path):
-        """Ingest all PDFs from a directory"""
-        pdf_files = list(directory.glob("*.pdf"))
-        
-        if not pdf_files:
-            logger.warning(f"⚠️ No PDF files found in {directory}")
-            return
+    def _page_ranges(self, pdf_files: List[Path]) -> Iterator[Tuple[Path, int, int, bool]]:
+        """(pdf, first page, last page, is last range of the pdf) extraction tasks"""
+        for pdf_path in pdf_files:
+            try:
+                page_count = len(_pdf_reader(str(pdf_path)).pages)
+            except Exception as e:
+                logger.error(f"❌ Failed to open {pdf_path}: {e}")
+                continue
+            # A PDF without pages still gets one (empty) range so it is recorded
+            for first in range(1, max(page_count, 1) + 1, INGEST_PAGES_PER_TASK):
+                last = min(page_count, first + INGEST_PAGES_PER_TASK - 1)
+                yield pdf_path, first, last, last == page_count
+    
+    def _extracted_pages(self, pdf_files: List[Path], stats: _StageStats) -> Iterator[Tuple[Path, List[Tuple[int, str]], bool]]:
+        """
+        Extract page ranges in a process pool, keeping at most two ranges per
+        worker in flight, and yield them in submission order.
+        """
+        tasks = self._page_ranges(pdf_files)
+        failed = set()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = deque()
+            
+            def submit_next() -> bool:
+                task = next(tasks, None)
+                if task is None:
+                    return False
+                in_flight.append((task, pool.submit(_extract_pages, str(task[0]), task[1], task[2])))
+                return True
+            
+            while len(in_flight) < 2 * self.workers and submit_next():
+                pass
+            while in_flight:
+                (pdf_path, first, last, is_last), future = in_flight.popleft()
+                submit_next()
+                if pdf_path in failed:
+                    future.cancel()
+                    continue
+                try:
+                    pages, seconds = future.result()
+                except Exception as e:
+                    # Skip the rest of this file; it stays out of the manifest and is retried next run
+                    logger.error(f"❌ Failed to extract pages {first}-{last} of {pdf_path.name}, skipping file: {e}")
+                    failed.add(pdf_path)
+                    continue
+                stats.add("extract", last - first + 1, seconds)
+                yield pdf_path, pages, is_last
+    
+    def _chunk_stream(self, pdf_files: List[Path], stats: _StageStats) -> Iterator[Union[Dict[str, Any], Tuple[Path, List[str]]]]:
+        """
+        Chunk records in file/page order; each file's last chunk is followed
+        by ``(pdf_path, chunk ids of the file)``
+        """
+        current, chunk_ids = None, []
+        for pdf_path, pages, is_last in self._extracted_pages(pdf_files, stats):
+            if pdf_path != current:
+                current, chunk_ids = pdf_path, []
+            doc_type = self._infer_doc_type(pdf_path.name)
+            for page_num, text in pages:
+                started = time.perf_counter()
+                page_chunks = self._page_chunks(pdf_path, page_num, text, doc_type)
+                stats.add("chunk", len(page_chunks), time.perf_counter() - started)
+                chunk_ids.extend(c["id"] for c in page_chunks)
+                yield from page_chunks
+            if is_last:
+                yield pdf_path, chunk_ids
+    
+    def ingest_files(self, pdf_files: List[Path], directories: List[Path] = ()) -> int:
+        """
+        Stream new or changed ``pdf_files`` through extract -> chunk ->
+        embed/store and return the number of chunks written. Previously
+        ingested PDFs in ``directories`` that are not in ``pdf_files`` any
+        more have their chunks deleted.
+        """
+        manifest = _IngestManifest(MANIFEST_FILE, {
+            "embed_model": EMBED_MODEL_ID,
+            "tokenizer": TOKENIZER_ID,
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap_tokens": self.chunk_overlap_tokens,
+            "chunk_ids": "path-page-index",
+        })
         
-        logger.info(f"📂 Found {len(pdf_files)} PDF files to process")
+        if chromadb_client.model_mismatch():
+            # Upsert would keep the old model's vectors for unchanged text, so start over
+            logger.info("🗑️  Embedding model changed, clearing existing vector database...")
+            chromadb_client.reset()
+            manifest.invalidate()
         
-        all_documents = []
-        all_metadatas = []
-        all_ids = []
+        current = {str(pdf_path.resolve()) for pdf_path in pdf_files}
+        scanned = {str(Path(directory).resolve()) for directory in directories}
+        removed = [key for key in manifest.files if key not in current and str(Path(key).parent) in scanned]
+        if removed:
+            deleted = chromadb_client.delete([chunk_id for key in removed for chunk_id in manifest.chunk_ids(key)])
+            for key in removed:
+                manifest.forget(key)
+            logger.info(f"🗑️  Removed {deleted} chunks of {len(removed)} deleted PDF files")
         
+        fingerprints: Dict[Path, Dict[str, Any]] = {}
         for pdf_path in pdf_files:
-            logger.info(f"Processing: {pdf_path.name}")
-            chunks = self.process_pdf(pdf_path)
-            
-            for chunk in chunks:
-                all_documents.append(chunk["text"])
-                all_metadatas.append(chunk["metadata"])
-                all_ids.append(chunk["id"])
+            fingerprint = manifest.changed(pdf_path)
+            if fingerprint is not None:
+                fingerprints[pdf_path] = fingerprint
+        todo = list(fingerprints)
+        manifest.save(force=True)
+        if len(todo) < len(pdf_files):
+            logger.info(f"⏩ Skipping {len(pdf_files) - len(todo)} unchanged PDF files")
+        if not todo:
+            return 0
+        logger.info(f"📂 Ingesting {len(todo)} PDF files with {self.workers} extract workers, "
+                    f"{self.batch_size} chunks per batch")
+        
+        stats = _StageStats()
+        batches: "queue.Queue[Optional[Tuple[List[Dict[str, Any]], List[Tuple[Path, List[str]]]]]]" = queue.Queue(INGEST_QUEUE_BATCHES)
+        errors: List[Exception] = []
+        written = 0
+        done_files: List[Path] = []
+        
+        def store_batches():
+            nonlocal written
+            while True:
+                item = batches.get()
+                if item is None:
+                    return
+                if errors:
+                    continue  # Keep draining so the producer never blocks
+                batch, finished = item
+                try:
+                    if batch:
+                        started = time.perf_counter()
+                        written += chromadb_client.upsert(
+                            ids=[c["id"] for c in batch],
+                            documents=[c["text"] for c in batch],
+                            metadatas=[c["metadata"] for c in batch]
+                        )
+                        stats.add("store", len(batch), time.perf_counter() - started)
+                    if finished:
+                        # Every chunk of these files is now in the store
+                        stale = []
+                        for pdf_path, chunk_ids in finished:
+                            produced = set(chunk_ids)
+                            stale.extend(c for c in manifest.chunk_ids(str(pdf_path.resolve())) if c not in produced)
+                        if stale:
+                            chromadb_client.delete(stale)
+                        for pdf_path, chunk_ids in finished:
+                            manifest.record(pdf_path, fingerprints[pdf_path], chunk_ids)
+                            done_files.append(pdf_path)
+                            logger.info(f"✅ Ingested {pdf_path.name} ({len(chunk_ids)} chunks)")
+                        manifest.save()
+                except Exception as e:
+                    logger.error(f"❌ Failed to store batch: {e}")
+                    errors.append(e)
+        
+        # Started at the first batch, after the extract pool has forked its workers
+        writer = threading.Thread(target=store_batches, name="pdf-ingest-store", daemon=True)
+        stream = self._chunk_stream(todo, stats)
+        batch: List[Dict[str, Any]] = []
+        finished: List[Tuple[Path, List[str]]] = []
+        try:
+            for item in stream:
+                if isinstance(item, tuple):
+                    finished.append(item)
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    if writer.ident is None:
+                        writer.start()
+                    batches.put((batch, finished))
+                    batch, finished = [], []
+                    if errors:
+                        break
+            if not errors:
+                batches.put((batch, finished))
+        finally:
+            stream.close()
+            if writer.ident is None:
+                writer.start()
+            batches.put(None)
+            writer.join()
+            manifest.save(force=True)
         
-        # Add to ChromaDB
-        if all_documents:
-            chromadb_client.add_documents(
-                documents=all_documents,
-                metadatas=all_metadatas,
-                ids=all_ids
-            )
-            logger.info(f"✅ Successfully ingested {len(all_documents)} chunks into ChromaDB")
+        stats.report()
+        if errors:
+            raise errors[0]
+        if len(done_files) < len(todo):
+            logger.warning(f"⚠️ {len(todo) - len(done_files)} files failed; re-run to retry only those")
+        logger.info(f"✅ Successfully ingested {written} chunks from {len(done_files)} files")
+        return written
+    
+    def ingest_directory(self, directory: Path):
+        """Ingest all PDFs from a directory"""
+        pdf_files = sorted(directory.glob("*.pdf"))
+        
+        if not pdf_files:
+            logger.warning(f"⚠️ No PDF files found in {directory}")
         else:
-            logger.warning("⚠️ No documents to ingest")
+            logger.info(f"📂 Found {len(pdf_files)} PDF files to process")
+        # Also drops chunks of PDFs deleted from the directory
+        self.ingest_files(pdf_files, directories=[directory])
 
 
 def ingest_knowledge_base():
@@ -189,29 +502,26 @@ def ingest_knowledge_base():
     # Also check root directory for PDFs
     root_dir = Path(__file__).parent.parent.parent
     
-    ingester = PDFIngester(chunk_size=1500, chunk_overlap=300)
+    ingester = PDFIngester()
     
-    # Ingest from knowledge_base directory
+    pdf_files = []
+    directories = [root_dir]
     if knowledge_base_dir.exists():
         logger.info(f"📂 Ingesting from: {knowledge_base_dir}")
-        ingester.ingest_directory(knowledge_base_dir)
+        pdf_files.extend(sorted(knowledge_base_dir.glob("*.pdf")))
+        directories.append(knowledge_base_dir)
     
     # Ingest from root directory (where your PDFs currently are)
     logger.info(f"📂 Ingesting from root: {root_dir}")
-    for pdf_file in root_dir.glob("*.pdf"):
-        logger.info(f"Processing: {pdf_file.name}")
-        chunks = ingester.process_pdf(pdf_file)
-        
-        if chunks:
-            documents = [c["text"] for c in chunks]
-            metadatas = [c["metadata"] for c in chunks]
-            ids = [c["id"] for c in chunks]
-            
-            chromadb_client.add_documents(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+    pdf_files.extend(sorted(root_dir.glob("*.pdf")))
+    
+    if not pdf_files:
+        logger.warning("⚠️ No documents to ingest")
+    # Only new or changed PDFs are processed; chunks of removed ones are deleted
+    ingester.ingest_files(pdf_files, directories=directories)
+    
+    # Merge the per-batch segments so the server maps a single file
+    chromadb_client.compact()
     
     # Print stats
     stats = chromadb_client.get_collection_stats()
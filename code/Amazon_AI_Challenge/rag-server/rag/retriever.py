@@ -3,16 +3,103 @@ RAG Retriever for querying the knowledge base
 Features:
 - Google text-embedding-004 for semantic understanding (768-dim vectors)
 - Appliance-specific filtering (washing machine, TV, AC)
+- Hybrid retrieval: vector scores fused with a BM25 index for exact ids/codes
 - Query preprocessing and intelligent result formatting
+- Formatted responses cached per (method, query, corpus version) with a TTL
 - Smart extraction of key troubleshooting information
 """
 from typing import List, Dict, Any
 from db.chromadb_client import chromadb_client
+from rag.response_cache import ResponseCache, normalize_query
+import bisect
+import functools
+import inspect
 import logging
+import os
 import re
 
 logger = logging.getLogger(__name__)
 
+# Formatted-response cache; a TTL or size of 0 disables it
+RESPONSE_CACHE_TTL = float(os.getenv("RAG_RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RAG_RESPONSE_CACHE_SIZE", "1024"))
+
+# Sentence extraction: prioritize sentences with key technical terms
+_SENTENCE_END_RE = re.compile(r'[.!?]\s+')
+_KEY_TERMS = ("error", "code", "cause", "solution", "fix", "check", "replace",
+              "problem", "issue", "step", "procedure", "warning", "note")
+# No term is a prefix of another, so at most one alternative matches at a position
+_KEY_TERMS_RE = re.compile("|".join(map(re.escape, _KEY_TERMS)))
+
+
+@functools.lru_cache(maxsize=4096)
+def _key_sentences(text: str) -> str:
+    """
+    The 5 sentences of ``text`` mentioning the most distinct key terms.
+    Sentence boundaries come from one compiled-regex pass and key terms from
+    one pass of a compiled alternation over the text lowered once, each hit
+    mapped to its sentence by offset. Memoized per chunk text, which recurs
+    across queries.
+    """
+    starts, ends = [0], []
+    for m in _SENTENCE_END_RE.finditer(text):
+        ends.append(m.start())
+        starts.append(m.end())
+    ends.append(len(text))
+    
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        terms_per_sentence = [set() for _ in starts]
+        # Resuming one character after each hit also finds overlapping terms
+        m = _KEY_TERMS_RE.search(lowered)
+        while m:
+            terms_per_sentence[bisect.bisect_right(starts, m.start()) - 1].add(m.group())
+            m = _KEY_TERMS_RE.search(lowered, m.start() + 1)
+    else:
+        # Lower-casing changed offsets (rare non-ASCII letters): score per sentence
+        terms_per_sentence = [
+            {term for term in _KEY_TERMS if term in text[start:end].lower()}
+            for start, end in zip(starts, ends)
+        ]
+    
+    scored_sentences = []
+    for start, end, terms in zip(starts, ends, terms_per_sentence):
+        sent = text[start:end].strip()
+        if len(sent) < 20:  # Skip very short sentences
+            continue
+        scored_sentences.append((len(terms), sent))
+    
+    # Sort by score and take top sentences
+    scored_sentences.sort(reverse=True, key=lambda x: x[0])
+    top_sentences = [s[1] for s in scored_sentences[:5]]
+    
+    return ". ".join(top_sentences) if top_sentences else text[:600]
+
+
+def _cached_response(method):
+    """
+    Cache a formatted-response method by its normalized query. The store
+    version is read before computing, so an answer computed while an
+    ingest lands is filed under the old version and never served again.
+    """
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.cache.enabled:
+            return method(self, *args, **kwargs)
+        # Positional and keyword spellings of a call share one entry
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        query, *rest = list(bound.arguments.values())[1:]
+        key = (method.__name__, normalize_query(query), tuple(rest), self.client.version)
+        result = self.cache.get(key)
+        if result is None:
+            result = method(self, *args, **kwargs)
+            self.cache.put(key, result)
+        return result
+    return wrapper
+
 
 class KnowledgeRetriever:
     """
@@ -37,6 +124,7 @@ class KnowledgeRetriever:
     
     def __init__(self):
         self.client = chromadb_client
+        self.cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
     
     def _detect_appliance_type(self, query: str) -> List[str]:
         """Detect appliance type from query and return matching PDF sources"""
@@ -44,7 +132,7 @@ class KnowledgeRetriever:
         
         for keyword, sources in self.APPLIANCE_MAP.items():
             if keyword in query_lower:
-                logger.info(f"Detected appliance: '{keyword}' -> filtering for {sources}")
+                logger.debug("Detected appliance: '%s' -> filtering for %s", keyword, sources)
                 return sources
         
         return []  # No specific appliance detected
@@ -73,27 +161,9 @@ class KnowledgeRetriever:
     
     def _extract_key_info(self, text: str) -> str:
         """Extract most relevant sentences from text"""
-        sentences = re.split(r'[.!?]\s+', text)
-        
-        # Prioritize sentences with key technical terms
-        key_terms = ["error", "code", "cause", "solution", "fix", "check", "replace", 
-                     "problem", "issue", "step", "procedure", "warning", "note"]
-        
-        scored_sentences = []
-        for sent in sentences:
-            sent = sent.strip()
-            if len(sent) < 20:  # Skip very short sentences
-                continue
-            
-            score = sum(1 for term in key_terms if term in sent.lower())
-            scored_sentences.append((score, sent))
-        
-        # Sort by score and take top sentences
-        scored_sentences.sort(reverse=True, key=lambda x: x[0])
-        top_sentences = [s[1] for s in scored_sentences[:5]]
-        
-        return ". ".join(top_sentences) if top_sentences else text[:600]
+        return _key_sentences(text)
     
+    @_cached_response
     def search_error_code(self, error_code: str) -> str:
         """
         Search for information about an error code
@@ -105,30 +175,25 @@ class KnowledgeRetriever:
         # Enhance query
         enhanced_query = self._preprocess_query(error_code, "error_code")
         
-        logger.info(f"Enhanced query: '{enhanced_query}'")
+        logger.debug("Enhanced query: '%s'", enhanced_query)
         
         # Search with optional filtering
         if appliance_sources:
-            all_docs = []
-            all_metas = []
-            for source in appliance_sources:
-                results = self.client.search(
-                    query=enhanced_query,
-                    n_results=3,
-                    filter_metadata={'source': source}
-                )
-                if results["documents"][0]:
-                    all_docs.extend(results["documents"][0])
-                    all_metas.extend(results["metadatas"][0])
+            # One scored pass across every manual for the appliance
+            results = self.client.hybrid_search(
+                query=enhanced_query,
+                n_results=3 * len(appliance_sources),
+                filter_metadata={'source': {'$in': appliance_sources}},
+                lexical_query=error_code
+            )
             
-            if not all_docs:
+            if not results["documents"][0]:
                 return f"❌ No information found for error code '{error_code}' in {appliance_sources[0].replace('.pdf', '').replace('_', ' ')}.\n\n💡 Please check the manual or contact support."
-            
-            results = {"documents": [all_docs], "metadatas": [all_metas]}
         else:
-            results = self.client.search(
+            results = self.client.hybrid_search(
                 query=enhanced_query,
-                n_results=5
+                n_results=5,
+                lexical_query=error_code
             )
         
         if not results["documents"][0]:
@@ -176,42 +241,68 @@ class KnowledgeRetriever:
         """
         Search for solutions based on symptom description
         """
-        # Detect appliance type for filtering
-        appliance_sources = self._detect_appliance_type(symptom_description)
-        
-        # Enhance query
-        enhanced_query = self._preprocess_query(symptom_description, "symptom")
-        
-        logger.info(f"Enhanced query: '{enhanced_query}'")
-        
-        # Search with appliance filtering if detected
-        if appliance_sources:
-            # Try each source and combine results
-            all_docs = []
-            all_metas = []
-            for source in appliance_sources:
-                results = self.client.search(
-                    query=enhanced_query,
-                    n_results=5,
-                    filter_metadata={'source': source}
+        return self.search_symptoms([symptom_description])[0]
+    
+    def search_symptoms(self, symptom_descriptions: List[str]) -> List[str]:
+        """
+        search_symptom() for several queries at once, e.g. all the lookups of
+        one citizen turn. Queries with the same appliance filter are embedded
+        in one batch and scored with one matrix-matrix product. Cached
+        answers are reused and only the misses are searched.
+        """
+        formatted: List[str] = [""] * len(symptom_descriptions)
+        version = self.client.version
+        keys = [("search_symptom", normalize_query(q), (), version) for q in symptom_descriptions]
+        if self.cache.enabled:
+            for pos, key in enumerate(keys):
+                formatted[pos] = self.cache.get(key) or ""
+        
+        # Group queries by detected appliance so each group shares a filter
+        groups: Dict[tuple, List[int]] = {}
+        enhanced_queries: Dict[int, str] = {}
+        for pos, symptom_description in enumerate(symptom_descriptions):
+            if formatted[pos]:
+                continue
+            appliance_sources = self._detect_appliance_type(symptom_description)
+            enhanced_query = self._preprocess_query(symptom_description, "symptom")
+            logger.debug("Enhanced query: '%s'", enhanced_query)
+            enhanced_queries[pos] = enhanced_query
+            groups.setdefault(tuple(appliance_sources), []).append(pos)
+        
+        for appliance_sources, positions in groups.items():
+            if appliance_sources:
+                # One scored pass across every manual for the appliance
+                results = self.client.hybrid_search_many(
+                    [enhanced_queries[pos] for pos in positions],
+                    n_results=5 * len(appliance_sources),
+                    filter_metadata={'source': {'$in': list(appliance_sources)}},
+                    lexical_queries=[symptom_descriptions[pos] for pos in positions]
                 )
-                if results["documents"][0]:
-                    all_docs.extend(results["documents"][0])
-                    all_metas.extend(results["metadatas"][0])
-            
-            if not all_docs:
+            else:
+                # No appliance detected, search all
+                results = self.client.hybrid_search_many(
+                    [enhanced_queries[pos] for pos in positions],
+                    n_results=7,  # Get more for better coverage
+                    lexical_queries=[symptom_descriptions[pos] for pos in positions]
+                )
+            for i, pos in enumerate(positions):
+                formatted[pos] = self._format_symptom_results(
+                    symptom_descriptions[pos], list(appliance_sources),
+                    results["documents"][i], results["metadatas"][i]
+                )
+                if self.cache.enabled:
+                    self.cache.put(keys[pos], formatted[pos])
+        return formatted
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Response cache counters plus the store version entries are keyed on"""
+        return dict(self.cache.stats(), enabled=self.cache.enabled, corpus_version=self.client.version)
+    
+    def _format_symptom_results(self, symptom_description: str, appliance_sources: List[str],
+                                documents: List[str], metadatas: List[Dict[str, Any]]) -> str:
+        if not documents:
+            if appliance_sources:
                 return f"❌ No troubleshooting information found for {appliance_sources[0].replace('.pdf', '').replace('_', ' ')}.\n\n💡 Try describing the problem differently."
-            
-            # Convert back to expected format
-            results = {"documents": [all_docs], "metadatas": [all_metas]}
-        else:
-            # No appliance detected, search all
-            results = self.client.search(
-                query=enhanced_query,
-                n_results=7  # Get more for better coverage
-            )
-        
-        if not results["documents"][0]:
             return "❌ No relevant troubleshooting information found. Please describe the issue in more detail."
         
         # Format results with extracted key info
@@ -221,8 +312,7 @@ class KnowledgeRetriever:
         seen_content = set()
         result_count = 0
         
-        for i, doc in enumerate(results["documents"][0]):
-            metadata = results["metadatas"][0][i]
+        for doc, metadata in zip(documents, metadatas):
             source = metadata.get("source", "Unknown")
             page = metadata.get("page", "")
             
@@ -255,17 +345,61 @@ class KnowledgeRetriever:
         response_parts.append("\n" + "="*70)
         return "\n".join(response_parts)
     
+    @_cached_response
+    def get_scheme_details(self, scheme_id_or_name: str) -> str:
+        """
+        All chunks of a scheme looked up by id, name or alias, without an
+        embedding call. Falls back to semantic search if no scheme matches.
+        """
+        results = self.client.lookup_scheme(scheme_id_or_name)
+        if not results["documents"][0]:
+            logger.info(f"No direct scheme match for '{scheme_id_or_name}', using semantic search")
+            return self.search_symptom(
+                f"{scheme_id_or_name} complete details benefits eligibility documents application process"
+            )
+        
+        first = results["metadatas"][0][0]
+        response_parts = [f"📄 SCHEME: {first.get('scheme_name', scheme_id_or_name)}\n"]
+        response_parts.append("="*70)
+        
+        # Sections in document order, even after some of them were re-ingested
+        scheme_order: Dict[str, int] = {}
+        for metadata in results["metadatas"][0]:
+            scheme_order.setdefault(metadata.get("scheme_id"), len(scheme_order))
+        chunks = sorted(
+            zip(results["documents"][0], results["metadatas"][0]),
+            key=lambda chunk: (scheme_order[chunk[1].get("scheme_id")], chunk[1].get("chunk_index", 0))
+        )
+        
+        current_scheme = None
+        for doc, metadata in chunks:
+            scheme_id = metadata.get("scheme_id")
+            scheme_name = metadata.get('scheme_name', scheme_id)
+            if scheme_id != current_scheme:
+                current_scheme = scheme_id
+                response_parts.append(f"\n📖 {scheme_name} [{scheme_id}] - {metadata.get('category', '')}")
+                response_parts.append("-"*70)
+            # The header already names the scheme each section chunk starts with
+            if doc.startswith(f"{scheme_name} - "):
+                doc = doc[len(scheme_name) + 3:]
+            response_parts.append(doc)
+        
+        response_parts.append("\n" + "="*70)
+        return "\n".join(response_parts)
+    
+    @_cached_response
     def search_spare_parts(self, part_query: str) -> str:
         """
         Search for spare part information
         """
         enhanced_query = self._preprocess_query(part_query, "spare_parts")
         
-        logger.info(f"Enhanced query: '{enhanced_query}'")
+        logger.debug("Enhanced query: '%s'", enhanced_query)
         
-        results = self.client.search(
+        results = self.client.hybrid_search(
             query=enhanced_query,
-            n_results=5
+            n_results=5,
+            lexical_query=part_query
         )
         
         if not results["documents"][0]:
@@ -308,23 +442,26 @@ class KnowledgeRetriever:
         
         return "\n".join(response_parts)
     
+    @_cached_response
     def search_sop(self, query: str) -> str:
         """
         Search for Standard Operating Procedures
         """
         enhanced_query = self._preprocess_query(query, "sop")
         
-        results = self.client.search(
+        results = self.client.hybrid_search(
             query=enhanced_query,
             n_results=3,
-            filter_metadata={"document_type": "sop"}
+            filter_metadata={"document_type": "sop"},
+            lexical_query=query
         )
         
         if not results["documents"][0]:
             # Try without filter
-            results = self.client.search(
+            results = self.client.hybrid_search(
                 query=enhanced_query,
-                n_results=3
+                n_results=3,
+                lexical_query=query
             )
         
         if not results["documents"][0]:
@@ -350,7 +487,7 @@ class KnowledgeRetriever:
         Returns raw results for custom processing
         """
         enhanced_query = self._preprocess_query(query)
-        return self.client.search(enhanced_query, n_results=n_results)
+        return self.client.hybrid_search(enhanced_query, n_results=n_results, lexical_query=query)
 
 
 # Global retriever instance
@@ -0,0 +1,160 @@
+"""
+Structured, sampled logging for the RAG MCP tools
+
+setup_logging() routes every record through a QueueHandler, so request
+threads only enqueue and a QueueListener thread does the formatting and
+stdout I/O. The listener is restarted in forked worker processes.
+
+@logged_tool wraps a tool and emits one JSON summary line per call
+(tool, arguments, latency, response size), sampled per tool. Errors are
+always logged. With RAG_LOG_FULL_OUTPUT=1 the complete response of every
+call is also written to a rotating file; the body is only rendered into a
+record when that is enabled.
+
+    RAG_LOG_SAMPLE_RATE=1.0                      default rate for every tool
+    RAG_LOG_SAMPLE_RATES=search_scheme_knowledge=0.1,get_scheme_knowledge=0.05
+"""
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DEFAULT_SAMPLE_RATE = float(os.getenv("RAG_LOG_SAMPLE_RATE", "1.0"))
+FULL_OUTPUT = os.getenv("RAG_LOG_FULL_OUTPUT", "0").lower() in ("1", "true", "yes")
+FULL_OUTPUT_FILE = Path(os.getenv("RAG_LOG_FULL_OUTPUT_FILE", str(Path(__file__).parent.parent / "logs" / "rag_outputs.log")))
+FULL_OUTPUT_MAX_MB = int(os.getenv("RAG_LOG_FULL_OUTPUT_MAX_MB", "20"))
+FULL_OUTPUT_BACKUPS = int(os.getenv("RAG_LOG_FULL_OUTPUT_BACKUPS", "5"))
+# Arguments longer than this are truncated in summary lines
+_MAX_ARG_CHARS = 200
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        name, sep, rate = item.partition("=")
+        if sep and name.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.getenv("RAG_LOG_SAMPLE_RATES", ""))
+
+summary_logger = logging.getLogger("rag.tools")
+# Not propagated: full responses go only to the rotating file
+output_logger = logging.getLogger("rag.tools.output")
+output_logger.propagate = False
+
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _start_listener():
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_logging(level: int = logging.INFO):
+    """Send root logging through a background queue (idempotent)."""
+    global _queue_handler, _listener
+    if _queue_handler is not None:
+        return
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream, respect_handler_level=True)
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level)
+    _listener.start()
+    # The listener thread does not survive fork(); give each child its own
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_start_listener)
+
+    if FULL_OUTPUT:
+        FULL_OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(
+            FULL_OUTPUT_FILE, maxBytes=FULL_OUTPUT_MAX_MB * 1024 * 1024,
+            backupCount=FULL_OUTPUT_BACKUPS, encoding="utf-8", delay=True,
+        )
+        rotating.setFormatter(logging.Formatter("%(message)s"))
+        # Written by a separate listener so large bodies never delay stdout
+        output_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        output_listener = logging.handlers.QueueListener(output_handler.queue, rotating)
+        output_listener.start()
+        output_logger.handlers = [output_handler]
+        output_logger.setLevel(logging.DEBUG)
+
+        def restart_output_listener():
+            nonlocal output_listener
+            output_handler.queue = queue.SimpleQueue()
+            output_listener = logging.handlers.QueueListener(output_handler.queue, rotating)
+            output_listener.start()
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=restart_output_listener)
+
+
+def _short(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > _MAX_ARG_CHARS:
+        return value[:_MAX_ARG_CHARS] + "..."
+    if isinstance(value, (list, tuple)):
+        return [_short(v) for v in value]
+    return value
+
+
+def logged_tool(error_prefix: str) -> Callable:
+    """
+    Decorate an async tool: time it, log a sampled summary line (and the
+    full response when enabled), and turn exceptions into an
+    ``"{error_prefix}: {error}"`` response after logging them.
+    """
+    def decorate(fn):
+        name = fn.__name__
+        rate = SAMPLE_RATES.get(name, DEFAULT_SAMPLE_RATE)
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                kwargs = signature.bind_partial(*args, **kwargs).arguments
+                summary_logger.error(
+                    "tool_error %s",
+                    json.dumps({"tool": name, "args": _short(kwargs), "error": str(e),
+                                "latency_ms": round((time.perf_counter() - started) * 1000, 2)},
+                               ensure_ascii=False, default=str),
+                    exc_info=True,
+                )
+                return f"{error_prefix}: {str(e)}"
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            if args:
+                kwargs = signature.bind_partial(*args, **kwargs).arguments
+            if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+                if summary_logger.isEnabledFor(logging.INFO):
+                    summary_logger.info(
+                        "tool_call %s",
+                        json.dumps({"tool": name, "args": _short(kwargs), "latency_ms": latency_ms,
+                                    "chars": len(result), "sample_rate": rate},
+                                   ensure_ascii=False, default=str),
+                    )
+            if FULL_OUTPUT and output_logger.isEnabledFor(logging.DEBUG):
+                output_logger.debug(json.dumps(
+                    {"ts": time.time(), "tool": name, "args": kwargs, "latency_ms": latency_ms, "output": result},
+                    ensure_ascii=False, default=str,
+                ))
+            return result
+
+        return wrapper
+    return decorate
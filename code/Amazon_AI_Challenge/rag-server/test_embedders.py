@@ -0,0 +1,74 @@
+"""
+Test the batched Google embedder offline against StubEmbedContent
+
+A stub that rate-limits a share of its calls with HTTP 429 stands in for
+genai.embed_content. The embedder must retry those calls, split the input
+at its batch size and return the vectors in input order even though the
+batches finish out of order on the thread pool.
+
+Run with: python test_embedders.py  (or python -m pytest test_embedders.py)
+"""
+import random
+import threading
+
+from db.embedders import GoogleBatchEmbedder, StubEmbedContent
+
+
+class _RecordingStub(StubEmbedContent):
+    """StubEmbedContent that also records the size of every batch it answers"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_sizes = []
+        self._sizes_lock = threading.Lock()
+
+    def __call__(self, model, content, **kwargs):
+        result = super().__call__(model, content, **kwargs)
+        with self._sizes_lock:
+            self.batch_sizes.append(len(content))
+        return result
+
+
+def _run_embedder(n_texts=230, batch_size=16, error_rate=0.3, seed=0):
+    rnd = random.Random(seed)
+    texts = [f"chunk {i} " + " ".join(rnd.choice("drum pump filter error code loan".split()) for _ in range(5))
+             for i in range(n_texts)]
+    stub = _RecordingStub(dim=8, latency=0.002, error_rate=error_rate, seed=seed)
+    embedder = GoogleBatchEmbedder("models/stub", embed_fn=stub, batch_size=batch_size,
+                                   max_workers=4, max_retries=50, base_delay=0.001, max_delay=0.01)
+
+    vectors = embedder.embed(texts)
+
+    # 429s were retried, and every retry came from a rate-limited call
+    assert stub.rate_limited > 0
+    assert embedder.retries == stub.rate_limited
+    assert stub.calls == len(stub.batch_sizes) + stub.rate_limited
+    # Batches split at the size limit, the remainder in one short batch
+    full, rest = divmod(n_texts, batch_size)
+    assert max(stub.batch_sizes) <= batch_size
+    assert sorted(stub.batch_sizes, reverse=True) == [batch_size] * full + ([rest] if rest else [])
+    # Vectors come back in input order across the pool
+    assert vectors == [stub._vector(t) for t in texts]
+    return len(stub.batch_sizes), stub.rate_limited
+
+
+def test_retries_order_and_batching():
+    _run_embedder()
+
+
+def test_exact_multiple_of_batch_size():
+    _run_embedder(n_texts=64, batch_size=16, seed=1)
+
+
+def test_single_batch():
+    _run_embedder(n_texts=10, batch_size=16, error_rate=0.9, seed=0)
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 70)
+    print("🧪 GOOGLE BATCH EMBEDDER - OFFLINE STUB TEST")
+    print("=" * 70)
+    for seed in range(3):
+        batches, retried = _run_embedder(seed=seed)
+        print(f"✅ seed {seed}: {batches} batches in order, {retried} rate-limited calls retried")
+    print("=" * 70)
@@ -0,0 +1,175 @@
+"""
+Test the vector store's segment log against a brute-force model
+
+Random upserts (new, edited, metadata-only and identical chunks), deletes,
+full and tail compactions and reconnects run on a temporary store in every
+storage mode. After each reconnect the live ids, texts, metadata and search
+results must match a plain dict of the chunks that should be there.
+Malformed metadata filters must be rejected rather than silently matching.
+
+Run with: python test_vector_store.py  (or python -m pytest test_vector_store.py)
+"""
+import os
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+# Offline hashing embedder, whatever .env selects
+os.environ["RAG_EMBED_BACKEND"] = "local"
+
+import numpy as np
+import db.chromadb_client as store
+
+MODES = {
+    "float32": {"VECTOR_STORAGE": "float32", "STORE_DTYPE": "float32"},
+    "float16": {"VECTOR_STORAGE": "float32", "STORE_DTYPE": "float16"},
+    "int8": {"VECTOR_STORAGE": "int8", "STORE_DTYPE": "float32"},
+    "sparse": {"VECTOR_STORAGE": "sparse", "STORE_DTYPE": "float32"},
+}
+WORDS = "farmer pension scholarship housing loan health drain pump error code filter drum spin".split()
+N_IDS = 60
+
+
+def _text(rnd):
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 12)))
+
+
+def _check(client, expected, rnd, tolerance):
+    """Compare a freshly connected client with the expected {id: (text, metadata)}"""
+    assert sorted(client.get_ids()) == sorted(expected)
+    stored = client.get(sorted(expected))
+    assert dict(zip(stored["ids"], zip(stored["documents"], stored["metadatas"]))) == expected
+
+    for group in (None, 0, 1, 2):
+        where = None if group is None else {"group": group}
+        ids = [id_ for id_, (_, md) in expected.items() if group is None or md["group"] == group]
+        assert sorted(client.get_ids(where)) == sorted(ids)
+        if not ids:
+            continue
+        query = _text(rnd)
+        k = min(5, len(ids))
+        result = client.search(query, n_results=k, filter_metadata=where)
+        found = result["ids"][0]
+        assert len(set(found)) == len(found) == k
+        # Brute force: every expected chunk scored with the same embedder
+        vectors = store._HASHER.transform([query] + [expected[id_][0] for id_ in ids])
+        scores = dict(zip(ids, vectors[1:] @ vectors[0]))
+        best = sorted(scores.values(), reverse=True)[:k]
+        assert np.allclose([scores[id_] for id_ in found], best, atol=tolerance)
+
+
+def _run_mode(settings, seed=0, steps=200):
+    overrides = dict(settings, ANN_INDEX="none", COMPACT_MAX_SEGMENTS=3, EMBED_BACKEND="local")
+    saved = {name: getattr(store, name) for name in [*overrides, "STORE_DIR"]}
+    tmp = Path(tempfile.mkdtemp(prefix="rag-store-test-"))
+    tolerance = 2e-3 if settings["STORE_DTYPE"] == "float16" else 1e-5
+    try:
+        for name, value in overrides.items():
+            setattr(store, name, value)
+        store.STORE_DIR = tmp
+
+        rnd = random.Random(seed)
+        expected = {}
+        client = store._VectorStoreClient()
+        client.connect()
+        reconnects = 0
+        for _ in range(steps):
+            op = rnd.random()
+            if op < 0.55:
+                ids = [f"c{rnd.randrange(N_IDS)}" for _ in range(rnd.randint(1, 8))]
+                # Reused text exercises skipped rows and reused vectors
+                docs = [expected[id_][0] if id_ in expected and rnd.random() < 0.5 else _text(rnd) for id_ in ids]
+                metas = [{"group": rnd.randrange(3)} for _ in ids]
+                client.upsert(ids=ids, documents=docs, metadatas=metas)
+                # The last occurrence of a repeated id wins
+                expected.update((id_, (doc, md)) for id_, doc, md in zip(ids, docs, metas))
+            elif op < 0.75:
+                ids = [f"c{rnd.randrange(N_IDS)}" for _ in range(rnd.randint(1, 5))]
+                client.delete(ids)
+                for id_ in ids:
+                    expected.pop(id_, None)
+            elif op < 0.85:
+                # Full merge or a tail merge, which must keep its delete records
+                client.wait_for_compaction()
+                client.compact(rnd.randrange(len(client._segments)) if client._segments else 0)
+            else:
+                client.wait_for_compaction()
+                client = store._VectorStoreClient()
+                client.connect()
+                _check(client, expected, rnd, tolerance)
+                reconnects += 1
+
+        client.wait_for_compaction()
+        client = store._VectorStoreClient()
+        client.connect()
+        _check(client, expected, rnd, tolerance)
+        return len(expected), reconnects + 1
+    finally:
+        for name, value in saved.items():
+            setattr(store, name, value)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _run_filters():
+    """Valid $in/$nin lists still match; malformed operator dicts raise ValueError"""
+    saved = {name: getattr(store, name) for name in ("STORE_DIR", "ANN_INDEX", "EMBED_BACKEND")}
+    tmp = Path(tempfile.mkdtemp(prefix="rag-store-test-"))
+    try:
+        store.STORE_DIR, store.ANN_INDEX, store.EMBED_BACKEND = tmp, "none", "local"
+        client = store._VectorStoreClient()
+        client.connect()
+        client.upsert(
+            ids=["a", "b", "c"],
+            documents=["drum error code", "pump filter", "loan pension"],
+            metadatas=[{"source": "abc", "page": 1}, {"source": "a", "page": 2}, {"source": "b", "page": 3}],
+        )
+        assert sorted(client.get_ids({"source": {"$in": ["a", "b"]}})) == ["b", "c"]
+        assert sorted(client.get_ids({"source": {"$nin": ("a", "b")}})) == ["a"]
+        assert sorted(client.get_ids({"page": {"$gte": 2, "$ne": 3}})) == ["b"]
+
+        bad = [{"page": {}}, {"page": {"$foo": 1}}, {"source": {"$in": "abc"}}, {"source": {"$nin": "abc"}}]
+        for where in bad:
+            for call in (client.get_ids, lambda w: client.search("drum", n_results=2, filter_metadata=w)):
+                try:
+                    call(where)
+                except ValueError:
+                    continue
+                raise AssertionError(f"filter {where} was accepted")
+        return len(bad)
+    finally:
+        for name, value in saved.items():
+            setattr(store, name, value)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def test_filters():
+    _run_filters()
+
+
+def test_segment_log_float32():
+    _run_mode(MODES["float32"])
+
+
+def test_segment_log_float16():
+    _run_mode(MODES["float16"])
+
+
+def test_segment_log_int8():
+    _run_mode(MODES["int8"])
+
+
+def test_segment_log_sparse():
+    _run_mode(MODES["sparse"])
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 70)
+    print("🧪 VECTOR STORE SEGMENT LOG - RANDOMIZED TEST")
+    print("=" * 70)
+    for name, settings in MODES.items():
+        for seed in range(3):
+            live, checks = _run_mode(settings, seed=seed)
+            print(f"✅ {name:<8} seed {seed}: {live} live chunks, {checks} reconnects matched")
+    print(f"✅ filters: {_run_filters()} malformed filters rejected")
+    print("=" * 70)